@@ -0,0 +1,55 @@
+from __future__ import annotations
+import random
+import sys
+from time import perf_counter
+from typing import List
+from core.ast import Node
+from core.exact import schedule_exact
+from core.schedule import build_task_graph, schedule_dataflow
+
+
+def random_tree(ops: int, rng: random.Random) -> Node:
+    """Random expression tree with `ops` binary operations."""
+    if ops == 0:
+        return Node(rng.choice("abcdefgh"))
+    left = rng.randint(0, ops - 1)
+    return Node(rng.choice("+-*/"), random_tree(left, rng), random_tree(ops - 1 - left, rng))
+
+
+def main() -> None:
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    max_nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    op_cost = {"+": 1, "-": 1, "*": 2, "/": 4}
+    rng = random.Random(2024)
+    print(f"schedule_dataflow (id priority) vs schedule_exact, {cases} random trees per size, max_nodes={max_nodes}")
+    print("P, memory banks and mem cost drawn from 2-4, 1-2 and 0-2")
+    print()
+    print("tasks | greedy optimal | mean gap | max gap | proven | greedy ms | exact ms")
+    print("-----:|---------------:|---------:|--------:|-------:|----------:|---------:")
+    for tasks in (8, 12, 16, 20, 25, 30, 35, 40):
+        gaps: List[float] = []
+        same = proven = 0
+        greedy_time = exact_time = 0.0
+        for _ in range(cases):
+            g = build_task_graph(random_tree(tasks, rng), op_cost)
+            p, banks, mem = rng.randint(2, 4), rng.randint(1, 2), rng.randint(0, 2)
+            t0 = perf_counter()
+            greedy, _runs = schedule_dataflow(g, p, banks, mem)
+            t1 = perf_counter()
+            exact = schedule_exact(g, p, banks, mem, max_nodes=max_nodes)
+            t2 = perf_counter()
+            greedy_time += t1 - t0
+            exact_time += t2 - t1
+            gaps.append((greedy - exact.makespan) / exact.makespan)
+            same += greedy == exact.makespan
+            proven += exact.optimal
+        print(
+            f"{tasks:>5} | {same / cases:>14.0%} | {sum(gaps) / cases:>8.1%} | {max(gaps):>7.1%} | "
+            f"{proven / cases:>6.0%} | {1000 * greedy_time / cases:>9.2f} | {1000 * exact_time / cases:>8.1f}"
+        )
+    print()
+    print("gap = (greedy - exact) / exact; with proven < 100% exact is the best schedule found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import sys
+from time import perf_counter
+from typing import Callable, List, Tuple
+from core.ast import Node, is_leaf
+from core.equivalence import clone, collect_chain_assoc, iter_nodes, replace_subtree, to_infix, to_postfix
+from core.parallel_form import build_parallel_form, collect_chain, flatten_plus_mul, rewrite_div_chain, rewrite_sub_chain
+from core.schedule import build_task_graph, build_tasks, schedule_dataflow
+
+
+def left_chain(op: str, n: int) -> Node:
+    root = Node("x0")
+    for i in range(1, n):
+        root = Node(op, root, Node(f"x{i}"))
+    return root
+
+
+def right_chain(op: str, n: int) -> Node:
+    root = Node(f"x{n - 1}")
+    for i in range(n - 2, -1, -1):
+        root = Node(op, Node(f"x{i}"), root)
+    return root
+
+
+def timed(name: str, fn: Callable[[], object]) -> Tuple[str, float]:
+    t0 = perf_counter()
+    fn()
+    return name, perf_counter() - t0
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    op_cost = {"+": 1, "-": 1, "*": 2, "/": 2}
+    print(f"Degenerate chains with {n} operands (recursion limit {sys.getrecursionlimit()})")
+    print()
+
+    for label, tree in (
+        ("left  +", left_chain("+", n)),
+        ("right *", right_chain("*", n)),
+        ("left  -", left_chain("-", n)),
+        ("left  /", left_chain("/", n)),
+    ):
+        # The deepest operation, so replace_subtree walks the whole chain.
+        target = [x for x in iter_nodes(tree) if not is_leaf(x)][-1]
+        rows: List[Tuple[str, float]] = [
+            timed("iter_nodes", lambda: iter_nodes(tree)),
+            timed("clone", lambda: clone(tree)),
+            timed("to_infix", lambda: to_infix(tree)),
+            timed("to_postfix", lambda: to_postfix(tree)),
+            timed("replace_subtree", lambda: replace_subtree(tree, target, Node("y"))),
+            timed("collect_chain", lambda: collect_chain(tree, tree.value)),
+            timed("collect_chain_assoc", lambda: collect_chain_assoc(tree, tree.value)),
+            timed("rewrite_div_chain", lambda: rewrite_div_chain(tree)),
+            timed("rewrite_sub_chain", lambda: rewrite_sub_chain(tree)),
+            timed("flatten_plus_mul", lambda: flatten_plus_mul(tree)),
+            timed("build_parallel_form", lambda: build_parallel_form(tree)),
+            timed("build_tasks", lambda: build_tasks(tree, op_cost)),
+            timed("build_task_graph", lambda: build_task_graph(tree, op_cost)),
+            timed("schedule_dataflow", lambda: schedule_dataflow(build_task_graph(tree, op_cost), 4, 2, 1)),
+        ]
+        print(f"{label} chain")
+        print("function | seconds")
+        print(":--------|-------:")
+        for name, secs in rows:
+            print(f"{name} | {secs:.4f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
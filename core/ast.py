@@ -1,5 +1,5 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 #L2
 OPS = {"+", "-", "*", "/"}
@@ -9,6 +9,7 @@ class Node:
     value: str
     left: Optional["Node"] = None
     right: Optional["Node"] = None
+    key: Optional[int] = field(default=None, init=False, repr=False, compare=False)
     __hash__ = object.__hash__
 
 def is_leaf(n: Node) -> bool:
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from core.ast import Node
+from core.schedule import (
+    PriorityFn,
+    Task,
+    TaskGraph,
+    TaskRun,
+    _levels,
+    _list_schedule,
+    _priority_key,
+    as_task_graph,
+    build_task_graph,
+)
+#L5
+Form = Union[Node, List[Task], TaskGraph]
+
+
+@dataclass(frozen=True)
+class JobResult:
+    index: int
+    tasks: int
+    start: int
+    completion: int
+    priority: int
+    deadline: Optional[int]
+
+    @property
+    def lateness(self) -> int:
+        return max(0, self.completion - self.deadline) if self.deadline is not None else 0
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    makespan: int
+    jobs: List[JobResult]
+    runs: List[TaskRun]
+    offsets: List[int]
+    throughput: float
+    utilization: float
+    bank_utilization: float
+
+    def job_of(self, task_id: int) -> int:
+        """Job index of a task id in runs."""
+        return bisect_left(self.offsets, task_id) - 1
+
+
+def merge_task_graphs(graphs: Sequence[Union[List[Task], TaskGraph]]) -> Tuple[TaskGraph, List[int]]:
+    """One TaskGraph holding the given graphs side by side.
+
+    Task k of graph j becomes index offsets[j] + k with id offsets[j] + k + 1;
+    there are no edges between graphs. offsets has one extra entry, the
+    total task count.
+    """
+    op_index: Dict[str, int] = {}
+    ids = array("i")
+    ops = array("H")
+    durations = array("i")
+    pred_ptr = array("i", [0])
+    pred = array("i")
+    offsets = [0]
+    for tasks in graphs:
+        g = as_task_graph(tasks)
+        base = offsets[-1]
+        remap = [op_index.setdefault(name, len(op_index)) for name in g.op_names]
+        ids.extend(range(base + 1, base + len(g) + 1))
+        ops.extend(remap[o] for o in g.ops)
+        durations.extend(g.durations)
+        shift = pred_ptr[-1]
+        pred.extend(base + d for d in g.pred)
+        pred_ptr.extend(shift + p for p in g.pred_ptr[1:])
+        offsets.append(base + len(g))
+    return TaskGraph(ids, ops, list(op_index), durations, pred_ptr, pred), offsets
+
+
+def schedule_batch(
+    forms: Sequence[Form],
+    processors: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Optional[Dict[str, int]] = None,
+    priorities: Optional[Sequence[int]] = None,
+    deadlines: Optional[Sequence[Optional[int]]] = None,
+    priority: Union[str, PriorityFn, None] = "blevel",
+    cse: bool = False,
+) -> BatchResult:
+    """Schedule many independent expressions in one run on a shared machine.
+
+    forms are ASTs (built with op_cost) or task lists/graphs. Their graphs
+    are merged and list-scheduled together, so idle processors pick up work
+    from any expression. Ready tasks are ordered by job priority (lower
+    first), then by latest start time deadline - blevel for jobs with a
+    deadline (least slack first, jobs without one after), then by the
+    `priority` policy of schedule_dataflow.
+
+    Throughput is expressions per time unit over the makespan; utilization
+    is the busy share of processor time and bank_utilization that of
+    memory-bank time.
+    """
+    if processors <= 0:
+        raise ValueError("processors must be > 0")
+    if memory_banks <= 0:
+        raise ValueError("memory_banks must be > 0")
+    if mem_cost < 0:
+        raise ValueError("mem_cost must be >= 0")
+    jobs = len(forms)
+    if priorities is not None and len(priorities) != jobs:
+        raise ValueError("priorities must have one entry per form")
+    if deadlines is not None and len(deadlines) != jobs:
+        raise ValueError("deadlines must have one entry per form")
+
+    graphs: List[TaskGraph] = []
+    for f in forms:
+        if isinstance(f, Node):
+            if op_cost is None:
+                raise ValueError("op_cost is required when scheduling ASTs")
+            graphs.append(build_task_graph(f, op_cost, cse=cse))
+        else:
+            graphs.append(as_task_graph(f))
+    g, offsets = merge_task_graphs(graphs)
+
+    job = array("i")
+    for j in range(jobs):
+        job.extend([j] * (offsets[j + 1] - offsets[j]))
+    job_prio = list(priorities) if priorities is not None else [0] * jobs
+    base = _priority_key(g, priority, mem_cost)
+    if deadlines is not None and any(d is not None for d in deadlines):
+        blevel = _levels(g, mem_cost)
+        inf = float("inf")
+        latest = [inf if deadlines[job[i]] is None else deadlines[job[i]] - blevel[i] for i in range(len(g))]
+
+        def key(i: int, ready_at: int) -> Tuple:
+            return (job_prio[job[i]], latest[i], base(i, ready_at) if base else i)
+    elif priorities is not None:
+
+        def key(i: int, ready_at: int) -> Tuple:
+            return (job_prio[job[i]], base(i, ready_at) if base else i)
+    else:
+        key = base  # type: ignore[assignment]
+
+    makespan, runs = _list_schedule(g, processors, memory_banks, mem_cost, key)
+
+    first = [-1] * jobs
+    last = [0] * jobs
+    for r in runs:
+        j = job[r.task_id - 1]
+        if first[j] < 0 or r.start < first[j]:
+            first[j] = r.start
+        last[j] = max(last[j], r.finish)
+    results = [
+        JobResult(
+            j,
+            offsets[j + 1] - offsets[j],
+            max(first[j], 0),
+            last[j],
+            job_prio[j],
+            deadlines[j] if deadlines is not None else None,
+        )
+        for j in range(jobs)
+    ]
+    busy = sum(g.durations)
+    return BatchResult(
+        makespan,
+        results,
+        runs,
+        offsets,
+        (jobs / makespan) if makespan > 0 else 0.0,
+        (busy / (processors * makespan)) if makespan > 0 else 0.0,
+        (len(g) * mem_cost / (memory_banks * makespan)) if makespan > 0 else 0.0,
+    )
+
+
+def print_batch(result: BatchResult) -> None:
+    print("job | tasks | prio | start | done | deadline | late")
+    print("---:|------:|-----:|------:|-----:|---------:|-----:")
+    for r in result.jobs:
+        dl = "-" if r.deadline is None else str(r.deadline)
+        print(f"{r.index:>3} | {r.tasks:>5} | {r.priority:>4} | {r.start:>5} | {r.completion:>4} | {dl:>8} | {r.lateness:>4}")
+    print(
+        f"makespan={result.makespan}, throughput={result.throughput:.4f}/t, "
+        f"utilization={result.utilization:.3f}, bank_utilization={result.bank_utilization:.3f}"
+    )
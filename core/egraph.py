@@ -0,0 +1,259 @@
+from __future__ import annotations
+from random import Random
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+from core.ast import Node, is_leaf
+from core.schedule import build_task_graph, schedule_dataflow
+#L_3_4
+ENode = Tuple[str, Tuple[int, ...]]
+# Right-hand side of a rewrite: an existing class id or an operator applied
+# to further right-hand sides.
+Pattern = Union[int, Tuple[str, Tuple["Pattern", ...]]]
+C = TypeVar("C")
+LocalCost = Callable[[str, Sequence[C]], C]
+
+
+class EGraph:
+    """E-graph over core.ast terms with the associativity and distributivity
+    rules used by assoc_generate and dist_rewrites_at_node."""
+
+    def __init__(self) -> None:
+        self._parent: List[int] = []
+        self._memo: Dict[ENode, int] = {}
+        self._classes: Dict[int, List[ENode]] = {}
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    def class_count(self) -> int:
+        return len(self._classes)
+
+    def find(self, a: int) -> int:
+        root = a
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[a] != root:
+            self._parent[a], a = root, self._parent[a]
+        return root
+
+    def nodes(self, cid: int) -> List[ENode]:
+        return self._classes[self.find(cid)]
+
+    def _canonical(self, en: ENode) -> ENode:
+        return (en[0], tuple(self.find(c) for c in en[1]))
+
+    def add(self, en: ENode) -> int:
+        en = self._canonical(en)
+        cid = self._memo.get(en)
+        if cid is not None:
+            return self.find(cid)
+        cid = len(self._parent)
+        self._parent.append(cid)
+        self._memo[en] = cid
+        self._classes[cid] = [en]
+        return cid
+
+    def add_term(self, root: Node) -> int:
+        ids: Dict[int, int] = {}
+        stack: List[Tuple[Node, bool]] = [(root, False)]
+        while stack:
+            x, expanded = stack.pop()
+            if is_leaf(x):
+                ids[id(x)] = self.add((x.value, ()))
+                continue
+            if not x.left or not x.right:
+                raise ValueError("Invalid AST")
+            if not expanded:
+                stack.append((x, True))
+                stack.append((x.right, False))
+                stack.append((x.left, False))
+                continue
+            ids[id(x)] = self.add((x.value, (ids[id(x.left)], ids[id(x.right)])))
+        return ids[id(root)]
+
+    def union(self, a: int, b: int) -> int:
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return a
+        if len(self._classes[a]) < len(self._classes[b]):
+            a, b = b, a
+        self._parent[b] = a
+        self._classes[a].extend(self._classes.pop(b))
+        return a
+
+    def rebuild(self) -> None:
+        changed = True
+        while changed:
+            changed = False
+            memo: Dict[ENode, int] = {}
+            for en, cid in self._memo.items():
+                en = self._canonical(en)
+                cid = self.find(cid)
+                other = memo.get(en)
+                if other is not None and self.find(other) != cid:
+                    cid = self.union(other, cid)
+                    changed = True
+                memo[en] = cid
+            self._memo = memo
+        classes: Dict[int, List[ENode]] = {}
+        for en, cid in self._memo.items():
+            classes.setdefault(self.find(cid), []).append(en)
+        self._classes = classes
+
+    def _instantiate(self, pat: Pattern) -> int:
+        if isinstance(pat, int):
+            return pat
+        op, kids = pat
+        return self.add((op, tuple(self._instantiate(k) for k in kids)))
+
+    def _matches(self) -> List[Tuple[int, Pattern]]:
+        out: List[Tuple[int, Pattern]] = []
+        for cid, ens in self._classes.items():
+            for op, kids in ens:
+                if len(kids) != 2 or op not in {"+", "*"}:
+                    continue
+                x, y = kids
+                for _, (p, q) in self._binary(y, op):
+                    out.append((cid, (op, ((op, (x, p)), q))))
+                for _, (p, q) in self._binary(x, op):
+                    out.append((cid, (op, (p, (op, (q, y))))))
+                if op == "*":
+                    for _, (p, q) in self._binary(y, "+"):
+                        out.append((cid, ("+", (("*", (x, p)), ("*", (x, q))))))
+                    for _, (p, q) in self._binary(x, "+"):
+                        out.append((cid, ("+", (("*", (p, y)), ("*", (q, y))))))
+                else:
+                    for _, (a, b) in self._binary(x, "*"):
+                        for _, (c, d) in self._binary(y, "*"):
+                            if self.find(a) == self.find(c):
+                                out.append((cid, ("*", (a, ("+", (b, d))))))
+                            if self.find(b) == self.find(d):
+                                out.append((cid, ("*", (("+", (a, c)), b))))
+        return out
+
+    def _binary(self, cid: int, op: str) -> List[ENode]:
+        return [en for en in self._classes[self.find(cid)] if en[0] == op and len(en[1]) == 2]
+
+    def saturate(self, max_nodes: int = 20000, max_iters: int = 50) -> bool:
+        """Apply the rewrite rules until nothing changes or a budget is hit.
+
+        Returns True if the e-graph is saturated.
+        """
+        for _ in range(max_iters):
+            before = (len(self._memo), len(self._classes))
+            for cid, pat in self._matches():
+                if len(self._memo) >= max_nodes:
+                    break
+                self.union(cid, self._instantiate(pat))
+            self.rebuild()
+            if (len(self._memo), len(self._classes)) == before:
+                return True
+            if len(self._memo) >= max_nodes:
+                return False
+        return False
+
+    def extract(self, root: int, cost: LocalCost) -> Tuple[C, Node]:
+        """Cheapest term of the root class under a bottom-up cost function.
+
+        cost(op, child_costs) must be monotone in the child costs.
+        """
+        best: Dict[int, Tuple[C, ENode]] = {}
+        changed = True
+        while changed:
+            changed = False
+            for cid, ens in self._classes.items():
+                for en in ens:
+                    kids = [self.find(k) for k in en[1]]
+                    if any(k not in best for k in kids):
+                        continue
+                    c = cost(en[0], [best[k][0] for k in kids])
+                    cur = best.get(cid)
+                    if cur is None or c < cur[0]:
+                        best[cid] = (c, en)
+                        changed = True
+        root = self.find(root)
+        return best[root][0], self._build(root, lambda cid: best[cid][1])
+
+    def _build(self, root: int, choose: Callable[[int], ENode]) -> Node:
+        results: List[Node] = []
+        stack: List[Tuple[int, Optional[ENode]]] = [(root, None)]
+        while stack:
+            cid, en = stack.pop()
+            if en is None:
+                en = choose(self.find(cid))
+                if en[1]:
+                    stack.append((cid, en))
+                    for k in reversed(en[1]):
+                        stack.append((k, None))
+                    continue
+                results.append(Node(en[0]))
+                continue
+            right = results.pop()
+            left = results.pop()
+            results.append(Node(en[0], left, right))
+        return results[0]
+
+    def sample_term(self, root: int, rng: Random) -> Node:
+        """Random term of the root class, one uniformly chosen e-node per class."""
+        return self._build(root, lambda cid: rng.choice(self._classes[cid]))
+
+
+def critical_path_cost(op_cost: Dict[str, int], mem_cost: int = 0) -> LocalCost:
+    """Local cost (critical path length, operation count) of a term."""
+
+    def cost(op: str, kids: Sequence[Tuple[int, int]]) -> Tuple[int, int]:
+        if not kids:
+            return (0, 0)
+        dur = op_cost.get(op)
+        if dur is None:
+            raise ValueError(f"Missing op cost for '{op}'")
+        return (int(dur) + mem_cost + max(k[0] for k in kids), 1 + sum(k[1] for k in kids))
+
+    return cost
+
+
+def makespan_score(
+    processors: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+) -> Callable[[Node], Tuple[int, int]]:
+    """Whole-term score (schedule_dataflow makespan, task count)."""
+
+    def score(n: Node) -> Tuple[int, int]:
+        tasks = build_task_graph(n, op_cost)
+        tp, _runs = schedule_dataflow(tasks, processors=processors, memory_banks=memory_banks, mem_cost=mem_cost)
+        return (tp, len(tasks))
+
+    return score
+
+
+def best_equivalent_form(
+    root: Node,
+    cost: LocalCost,
+    score: Optional[Callable[[Node], object]] = None,
+    max_nodes: int = 20000,
+    max_iters: int = 50,
+    samples: int = 64,
+    seed: int = 0,
+) -> Node:
+    """Saturate the e-graph of root and extract its best equivalent form.
+
+    The term minimising the bottom-up cost is extracted directly. If a
+    whole-term score is given (e.g. makespan_score), that term competes with
+    `samples` random terms of the e-graph and the best scoring one wins.
+    """
+    g = EGraph()
+    cid = g.add_term(root)
+    g.saturate(max_nodes=max_nodes, max_iters=max_iters)
+    _, best = g.extract(cid, cost)
+    if score is None:
+        return best
+    rng = Random(seed)
+    best_score = score(best)
+    for _ in range(samples):
+        cand = g.sample_term(cid, rng)
+        s = score(cand)
+        if s < best_score:  # type: ignore[operator]
+            best, best_score = cand, s
+    return best
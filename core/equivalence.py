@@ -1,169 +1,426 @@
 from __future__ import annotations
-from typing import List, Set, Tuple
+from collections import deque
+from math import comb
+from time import monotonic
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
 from core.ast import Node, is_leaf
+from core.intern import NodeStore, structural_key
 
 #L_3_4
+Path = Tuple  # () or (step, Path); see iter_paths
+
+
 def clone(n: Node) -> Node:
-    if is_leaf(n):
-        return Node(n.value)
-    return Node(n.value, clone(n.left) if n.left else None, clone(n.right) if n.right else None)
+    results: List[Node] = []
+    stack: List[Tuple[Node, bool]] = [(n, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if is_leaf(x):
+            results.append(Node(x.value))
+            continue
+        if not expanded:
+            stack.append((x, True))
+            if x.right:
+                stack.append((x.right, False))
+            if x.left:
+                stack.append((x.left, False))
+            continue
+        right = results.pop() if x.right else None
+        left = results.pop() if x.left else None
+        results.append(Node(x.value, left, right))
+    return results[0]
 
 
 def to_infix(n: Node) -> str:
-    if is_leaf(n):
-        return n.value
-    if not n.left or not n.right:
-        raise ValueError("Invalid AST")
-    return f"({to_infix(n.left)}{n.value}{to_infix(n.right)})"
+    parts: List[str] = []
+    stack: List[object] = [n]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, str):
+            parts.append(x)
+            continue
+        if is_leaf(x):
+            parts.append(x.value)
+            continue
+        if not x.left or not x.right:
+            raise ValueError("Invalid AST")
+        parts.append("(")
+        stack.append(")")
+        stack.append(x.right)
+        stack.append(x.value)
+        stack.append(x.left)
+    return "".join(parts)
+
+
+def to_postfix(n: Node) -> List[str]:
+    """Postorder token list of n, the inverse of core.parse.rpn_to_ast."""
+    out: List[str] = []
+    stack: List[Tuple[Node, bool]] = [(n, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if expanded or is_leaf(x):
+            out.append(x.value)
+            continue
+        if not x.left or not x.right:
+            raise ValueError("Invalid AST")
+        stack.append((x, True))
+        stack.append((x.right, False))
+        stack.append((x.left, False))
+    return out
 
 
 def iter_nodes(root: Node) -> List[Node]:
     acc: List[Node] = []
-
-    def dfs(x: Node) -> None:
+    stack: List[Node] = [root]
+    while stack:
+        x = stack.pop()
         acc.append(x)
-        if x.left:
-            dfs(x.left)
         if x.right:
-            dfs(x.right)
-
-    dfs(root)
+            stack.append(x.right)
+        if x.left:
+            stack.append(x.left)
     return acc
 
 
 def replace_subtree(root: Node, target: Node, replacement: Node) -> Node:
-    if root is target:
-        return replacement
-    if is_leaf(root):
-        return Node(root.value)
-    left = replace_subtree(root.left, target, replacement) if root.left else None
-    right = replace_subtree(root.right, target, replacement) if root.right else None
-    return Node(root.value, left, right)
+    results: List[Node] = []
+    stack: List[Tuple[Node, bool]] = [(root, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if x is target:
+            results.append(replacement)
+            continue
+        if is_leaf(x):
+            results.append(Node(x.value))
+            continue
+        if not expanded:
+            stack.append((x, True))
+            if x.right:
+                stack.append((x.right, False))
+            if x.left:
+                stack.append((x.left, False))
+            continue
+        right = results.pop() if x.right else None
+        left = results.pop() if x.left else None
+        results.append(Node(x.value, left, right))
+    return results[0]
+
+
+def iter_paths(root: Node) -> Iterator[Tuple[Path, Node]]:
+    """Preorder (path, node) pairs, in iter_nodes order.
+
+    A path is a cons list, () for the root and (step, parent_path) below it,
+    with step 0 for a left and 1 for a right child. Each yield then costs
+    O(1) even on very deep trees.
+    """
+    stack: List[Tuple[Path, Node]] = [((), root)]
+    while stack:
+        path, x = stack.pop()
+        yield path, x
+        if x.right:
+            stack.append(((1, path), x.right))
+        if x.left:
+            stack.append(((0, path), x.left))
+
+
+def path_steps(path: Path) -> List[int]:
+    steps: List[int] = []
+    while path:
+        steps.append(path[0])
+        path = path[1]
+    steps.reverse()
+    return steps
+
+
+def replace_at(
+    root: Node,
+    path: Path,
+    replacement: Node,
+    make: Callable[[str, Optional[Node], Optional[Node]], Node] = Node,
+) -> Node:
+    steps = path_steps(path)
+    spine: List[Node] = []
+    x = root
+    for step in steps:
+        spine.append(x)
+        x = x.right if step else x.left
+    cur = replacement
+    for parent, step in zip(reversed(spine), reversed(steps)):
+        if step:
+            cur = make(parent.value, parent.left, cur)
+        else:
+            cur = make(parent.value, cur, parent.right)
+    return cur
 
 
 def collect_chain_assoc(n: Node, op: str) -> List[Node]:
     items: List[Node] = []
-
-    def dfs(x: Node) -> None:
+    stack: List[Node] = [n]
+    while stack:
+        x = stack.pop()
         if x.value == op and x.left and x.right:
-            dfs(x.left)
-            dfs(x.right)
+            stack.append(x.right)
+            stack.append(x.left)
         else:
             items.append(x)
-
-    dfs(n)
     return items
 
 
-def all_assoc_trees(op: str, operands: List[Node]) -> List[Node]:
-    if len(operands) == 1:
-        return [clone(operands[0])]
-    res: List[Node] = []
-    for i in range(1, len(operands)):
-        left_ops = operands[:i]
-        right_ops = operands[i:]
-        left_trees = all_assoc_trees(op, left_ops)
-        right_trees = all_assoc_trees(op, right_ops)
-        for lt in left_trees:
-            for rt in right_trees:
-                res.append(Node(op, lt, rt))
-    return res
+# Sub-ranges with at most this many bracketings are kept once enumerated,
+# larger ones are regenerated on demand so memory stays bounded.
+_ASSOC_MEMO_LIMIT = 1024
+# iter_assoc_trees nests one generator per operand; longer chains are
+# enumerated by rank instead, so the depth stays within the recursion limit.
+_ASSOC_NESTED_MAX = 64
 
 
-def assoc_generate(root: Node, max_results: int) -> List[Node]:
-    base = clone(root)
-    seen: Set[str] = set()
-    q: List[Node] = []
-    out: List[Node] = []
+def count_assoc_trees(n: int) -> int:
+    """Number of bracketings of an n-operand chain, Catalan(n - 1)."""
+    if n <= 0:
+        return 0
+    return comb(2 * n - 2, n - 1) // n
+
+
+def _assoc_counts(n: int) -> List[int]:
+    # count_assoc_trees(m) for m in 0..n, by the Catalan recurrence.
+    counts = [0, 1][:n + 1]
+    for m in range(1, n):
+        counts.append(counts[m] * 2 * (2 * m - 1) // (m + 1))
+    return counts
 
-    def push(x: Node) -> None:
-        k = to_infix(x)
-        if k in seen:
-            return
-        seen.add(k)
-        out.append(x)
-        q.append(x)
 
-    push(base)
+def iter_assoc_trees(op: str, operands: List[Node], store: Optional[NodeStore] = None) -> Iterator[Node]:
+    """Lazily yield every bracketing of operands, in all_assoc_trees order.
 
-    while q and len(out) < max_results:
-        cur = q.pop(0)
-        for node in iter_nodes(cur):
+    Operand subtrees are shared between the yielded trees, not cloned.
+    Chains of more than _ASSOC_NESTED_MAX operands are yielded by
+    unrank_assoc_tree, rank by rank, so any length works.
+    """
+    make = store.make if store is not None else Node
+    if len(operands) > _ASSOC_NESTED_MAX:
+        counts = _assoc_counts(len(operands))
+        for k in range(counts[-1]):
+            yield _unrank(op, operands, k, make, counts)
+        return
+    memo: Dict[Tuple[int, int], List[Node]] = {}
+
+    def trees(i: int, j: int) -> Iterator[Node]:
+        if j - i == 1:
+            yield operands[i]
+            return
+        cached = memo.get((i, j))
+        if cached is not None:
+            yield from cached
+            return
+        acc: Optional[List[Node]] = [] if count_assoc_trees(j - i) <= _ASSOC_MEMO_LIMIT else None
+        for split in range(i + 1, j):
+            for lt in trees(i, split):
+                for rt in trees(split, j):
+                    t = make(op, lt, rt)
+                    if acc is not None:
+                        acc.append(t)
+                    yield t
+        if acc is not None:
+            memo[(i, j)] = acc
+
+    if operands:
+        yield from trees(0, len(operands))
+
+
+def unrank_assoc_tree(op: str, operands: List[Node], k: int, store: Optional[NodeStore] = None) -> Node:
+    """Build the k-th bracketing of operands without enumerating the others."""
+    counts = _assoc_counts(len(operands))
+    if not 0 <= k < counts[-1]:
+        raise IndexError("bracketing index out of range")
+    return _unrank(op, operands, k, store.make if store is not None else Node, counts)
+
+
+def _unrank(op: str, operands: List[Node], k: int, make: Callable[..., Node], counts: List[int]) -> Node:
+    # Ranks run over the split point, then the left bracketing, then the
+    # right one. Frames are (i, j, rank, split), split -1 until expanded.
+    results: List[Node] = []
+    stack: List[Tuple[int, int, int, int]] = [(0, len(operands), k, -1)]
+    while stack:
+        i, j, r, split = stack.pop()
+        if j - i == 1:
+            results.append(operands[i])
+            continue
+        if split >= 0:
+            right = results.pop()
+            left = results.pop()
+            results.append(make(op, left, right))
+            continue
+        for split in range(i + 1, j):
+            right_count = counts[j - split]
+            block = counts[split - i] * right_count
+            if r < block:
+                break
+            r -= block
+        stack.append((i, j, r, split))
+        stack.append((split, j, r % right_count, -1))
+        stack.append((i, split, r // right_count, -1))
+    return results[0]
+
+
+def all_assoc_trees(op: str, operands: List[Node], store: Optional[NodeStore] = None) -> List[Node]:
+    return list(iter_assoc_trees(op, operands, store))
+
+
+def _deadline(time_budget: Optional[float], deadline: Optional[float]) -> Optional[float]:
+    if time_budget is None:
+        return deadline
+    t = monotonic() + time_budget
+    return t if deadline is None else min(t, deadline)
+
+
+def _expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and monotonic() >= deadline
+
+
+def iter_assoc_forms(
+    root: Node,
+    max_results: Optional[int] = None,
+    store: Optional[NodeStore] = None,
+    time_budget: Optional[float] = None,
+    max_pending: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Node]:
+    """Yield associativity-equivalent forms of root in BFS order as found.
+
+    Stops after max_results forms, time_budget seconds after iteration
+    starts, or at deadline (a time.monotonic() value), whichever comes first; a
+    deadline lets several generators share one budget. max_pending caps
+    how many discovered forms are queued for expansion (the memory budget);
+    forms found past the cap are still yielded but not expanded.
+    """
+    if max_results is not None and max_results <= 0:
+        return
+    deadline = _deadline(time_budget, deadline)
+    base = store.intern(root) if store is not None else clone(root)
+    make = store.make if store is not None else Node
+    seen: Set[int] = {structural_key(base)}
+    q: Deque[Node] = deque([base])
+    produced = 1
+    yield base
+
+    while q:
+        if max_results is not None and produced >= max_results:
+            return
+        cur = q.popleft()
+        for path, node in iter_paths(cur):
             if node.value not in {"+", "*"}:
                 continue
             ops = collect_chain_assoc(node, node.value)
             if len(ops) <= 2:
                 continue
-            variants = all_assoc_trees(node.value, ops)
-            for v in variants:
-                push(replace_subtree(cur, node, v))
-                if len(out) >= max_results:
-                    break
-            if len(out) >= max_results:
-                break
+            for v in iter_assoc_trees(node.value, ops, store):
+                if _expired(deadline):
+                    return
+                x = replace_at(cur, path, v, make)
+                k = structural_key(x)
+                if k in seen:
+                    continue
+                seen.add(k)
+                if max_pending is None or len(q) < max_pending:
+                    q.append(x)
+                produced += 1
+                yield x
+                if max_results is not None and produced >= max_results:
+                    return
 
-    return out[:max_results]
 
+def assoc_generate(root: Node, max_results: int, store: Optional[NodeStore] = None) -> List[Node]:
+    return list(iter_assoc_forms(root, max_results, store))
 
-def dist_rewrites_at_node(node: Node) -> List[Node]:
+
+def _shared(n: Node) -> Node:
+    return n
+
+
+def dist_rewrites_at_node(node: Node, store: Optional[NodeStore] = None) -> List[Node]:
     if not node.left or not node.right:
         return []
 
     res: List[Node] = []
+    make = store.make if store is not None else Node
+    cp = _shared if store is not None else clone
 
     if node.value == "*":
         a = node.left
         b = node.right
 
         if b.value == "+" and b.left and b.right:
-            left = Node("*", clone(a), clone(b.left))
-            right = Node("*", clone(a), clone(b.right))
-            res.append(Node("+", left, right))
+            left = make("*", cp(a), cp(b.left))
+            right = make("*", cp(a), cp(b.right))
+            res.append(make("+", left, right))
 
         if a.value == "+" and a.left and a.right:
-            left = Node("*", clone(a.left), clone(b))
-            right = Node("*", clone(a.right), clone(b))
-            res.append(Node("+", left, right))
+            left = make("*", cp(a.left), cp(b))
+            right = make("*", cp(a.right), cp(b))
+            res.append(make("+", left, right))
 
     if node.value == "+":
         x = node.left
         y = node.right
         if x and y and x.value == "*" and y.value == "*" and x.left and x.right and y.left and y.right:
-            if to_infix(x.left) == to_infix(y.left):
-                res.append(Node("*", clone(x.left), Node("+", clone(x.right), clone(y.right))))
-            if to_infix(x.right) == to_infix(y.right):
-                res.append(Node("*", Node("+", clone(x.left), clone(y.left)), clone(x.right)))
+            if structural_key(x.left) == structural_key(y.left):
+                res.append(make("*", cp(x.left), make("+", cp(x.right), cp(y.right))))
+            if structural_key(x.right) == structural_key(y.right):
+                res.append(make("*", make("+", cp(x.left), cp(y.left)), cp(x.right)))
 
     return res
 
 
-def dist_generate(root: Node, max_results: int, max_steps: int) -> List[Node]:
-    base = clone(root)
-    seen: Set[str] = set()
-    out: List[Node] = []
-    frontier: List[Tuple[Node, int]] = []
-
-    def push(x: Node, d: int) -> None:
-        k = to_infix(x)
-        if k in seen:
+def iter_dist_forms(
+    root: Node,
+    max_steps: int,
+    max_results: Optional[int] = None,
+    store: Optional[NodeStore] = None,
+    time_budget: Optional[float] = None,
+    max_pending: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Node]:
+    """Yield forms reachable by at most max_steps distributivity rewrites.
+
+    Budgets behave as in iter_assoc_forms.
+    """
+    if max_results is not None and max_results <= 0:
+        return
+    deadline = _deadline(time_budget, deadline)
+    base = store.intern(root) if store is not None else clone(root)
+    make = store.make if store is not None else Node
+    seen: Set[int] = {structural_key(base)}
+    frontier: Deque[Tuple[Node, int]] = deque()
+    if max_steps > 0:
+        frontier.append((base, 0))
+    produced = 1
+    yield base
+
+    while frontier:
+        if max_results is not None and produced >= max_results:
             return
-        seen.add(k)
-        out.append(x)
-        frontier.append((x, d))
-
-    push(base, 0)
-
-    while frontier and len(out) < max_results:
-        cur, d = frontier.pop(0)
-        if d >= max_steps:
-            continue
-
-        for node in iter_nodes(cur):
-            for repl in dist_rewrites_at_node(node):
-                push(replace_subtree(cur, node, repl), d + 1)
-                if len(out) >= max_results:
-                    break
-            if len(out) >= max_results:
-                break
-
-    return out[:max_results]
+        cur, d = frontier.popleft()
+        for path, node in iter_paths(cur):
+            for repl in dist_rewrites_at_node(node, store):
+                if _expired(deadline):
+                    return
+                x = replace_at(cur, path, repl, make)
+                k = structural_key(x)
+                if k in seen:
+                    continue
+                seen.add(k)
+                if d + 1 < max_steps and (max_pending is None or len(frontier) < max_pending):
+                    frontier.append((x, d + 1))
+                produced += 1
+                yield x
+                if max_results is not None and produced >= max_results:
+                    return
+
+
+def dist_generate(
+    root: Node,
+    max_results: int,
+    max_steps: int,
+    store: Optional[NodeStore] = None,
+) -> List[Node]:
+    return list(iter_dist_forms(root, max_steps, max_results, store))
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from collections import OrderedDict
+from hashlib import blake2b
+import json
+from pathlib import Path
+import sqlite3
+from typing import Dict, Optional, Tuple, Union
+from core.ast import Node
+from core.equivalence import to_postfix
+from core.intern import structural_key
+#L6
+PathLike = Union[str, Path]
+Config = Tuple[object, ...]
+
+
+def config_key(processors: int, memory_banks: int, mem_cost: int, op_cost: Dict[str, int], cse: bool = False) -> Config:
+    key: Config = (processors, memory_banks, mem_cost, tuple(sorted(op_cost.items())))
+    # Plain configs keep their old shape so existing cache files stay valid.
+    return key + ("cse",) if cse else key
+
+
+def form_digest(n: Node) -> str:
+    """Structural hash of n that is stable across processes and runs."""
+    return blake2b("\x1f".join(to_postfix(n)).encode(), digest_size=16).hexdigest()
+
+
+class EvalCache:
+    """Size-bounded LRU cache of form evaluations.
+
+    Entries are keyed by the structural key of the form plus the machine
+    config. With a path, entries are also persisted to an SQLite file keyed
+    by form_digest, so later runs and sweeps can reuse them.
+    """
+
+    def __init__(self, maxsize: int = 100_000, path: Optional[PathLike] = None) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be > 0")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._mem: OrderedDict[Tuple[int, Config], Tuple] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending = 0
+        if path is not None:
+            self._db = sqlite3.connect(str(path))
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS evals ("
+                "form TEXT NOT NULL, config TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (form, config))"
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def __enter__(self) -> "EvalCache":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _remember(self, key: Tuple[int, Config], value: Tuple) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def get(self, form: Node, config: Config) -> Optional[Tuple]:
+        key = (structural_key(form), config)
+        value = self._mem.get(key)
+        if value is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return value
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value FROM evals WHERE form = ? AND config = ?",
+                (form_digest(form), json.dumps(config)),
+            ).fetchone()
+            if row is not None:
+                value = tuple(json.loads(row[0]))
+                self._remember(key, value)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, form: Node, config: Config, value: Tuple) -> None:
+        self._remember((structural_key(form), config), value)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO evals (form, config, value) VALUES (?, ?, ?)",
+                (form_digest(form), json.dumps(config), json.dumps(list(value))),
+            )
+            self._pending += 1
+            if self._pending >= 1000:
+                self.flush()
+
+    def flush(self) -> None:
+        if self._db is not None and self._pending:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "size": len(self._mem),
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
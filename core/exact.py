@@ -0,0 +1,253 @@
+from __future__ import annotations
+from bisect import insort
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+from core.schedule import Task, TaskGraph, TaskRun, _levels, _list_schedule, _priority_key, as_task_graph
+#L5
+# A task occupies a processor from the start of its memory access to its
+# finish, and a bank during the access. This is the schedule_dataflow model
+# without its greedy choices: a processor is never held while its task
+# waits for a bank or an operand, so every greedy schedule is feasible here.
+#
+# Search space: tasks are placed one at a time, each at the earliest time
+# that is not before the previous placement, on the processor and bank
+# that free up first. Every active schedule (no task can start earlier
+# without moving another) is produced by placing its tasks in order of
+# start time, and some optimal schedule is active, so the search is
+# exact. All placed intervals start no later than the last placement, so
+# a state is the placed set plus release times: of processors, of banks
+# and of placed tasks that still have unplaced successors. A state whose
+# times are all at least those of an explored state with the same placed
+# set cannot do better and is cut.
+
+_MEMO_PER_SET = 16
+
+
+@dataclass(frozen=True)
+class ExactSchedule:
+    makespan: int
+    runs: List[TaskRun]
+    optimal: bool  # False if max_nodes ran out first
+    lower_bound: int
+    nodes: int
+
+
+def schedule_exact(
+    tasks: Union[List[Task], TaskGraph],
+    processors: int,
+    memory_banks: int,
+    mem_cost: int,
+    max_nodes: int = 1_000_000,
+    max_states: int = 1_000_000,
+) -> ExactSchedule:
+    """Minimum-makespan schedule by branch and bound, for small graphs
+    (up to some 30-40 tasks).
+
+    The best greedy schedule_dataflow run over the built-in priorities
+    gives the initial upper bound. Nodes are cut on the critical path from
+    the current state, on processor and bank work bounds
+    (_resource_bound), and on state dominance (up to max_states memoized
+    states). After max_nodes search nodes the best schedule so far is
+    returned with optimal=False. runs are TaskRuns as from schedule_dataflow.
+    """
+    if processors <= 0:
+        raise ValueError("processors must be > 0")
+    if memory_banks <= 0:
+        raise ValueError("memory_banks must be > 0")
+    if mem_cost < 0:
+        raise ValueError("mem_cost must be >= 0")
+    g = as_task_graph(tasks)
+    n = len(g)
+    if not n:
+        return ExactSchedule(0, [], True, 0, 0)
+
+    m = mem_cost
+    dur = list(g.durations)
+    level = _levels(g, m)
+    preds = [list(g.pred[g.pred_ptr[i]:g.pred_ptr[i + 1]]) for i in range(n)]
+    topo = _topological_order(g)
+    pred_mask = [0] * n
+    succ_mask = [0] * n
+    for i in range(n):
+        for d in preds[i]:
+            pred_mask[i] |= 1 << d
+            succ_mask[d] |= 1 << i
+    full = (1 << n) - 1
+
+    best: Optional[Tuple[int, List[TaskRun]]] = None
+    for priority in ("id", "blevel", "hlfet", "etf"):
+        makespan, runs = _list_schedule(g, processors, memory_banks, m, _priority_key(g, priority, m))
+        if best is None or makespan < best[0]:
+            best = (makespan, runs)
+    ub, best_runs = best  # type: ignore[misc]
+    best_starts: Optional[List[int]] = None
+
+    finish = [0] * n
+    start = [0] * n
+    memo: Dict[int, List[Tuple[int, ...]]] = {}
+    stored = 0
+    nodes = 0
+    complete = True
+
+    head = [0] * n
+    proc_len = [m + d for d in dur]
+    proc_tail = [level[i] - m - dur[i] for i in range(n)]
+    bank_len = [m] * n
+    bank_tail = [level[i] - m for i in range(n)]
+
+    def bound(placed: int, t: int, procs: List[int], banks: List[int]) -> int:
+        lb = procs[-1]
+        todo: List[int] = []
+        for j in topo:
+            if placed >> j & 1:
+                continue
+            e = t
+            for d in preds[j]:
+                x = finish[d] if placed >> d & 1 else head[d] + m + dur[d]
+                if x > e:
+                    e = x
+            head[j] = e
+            if e + level[j] > lb:
+                lb = e + level[j]
+            todo.append(j)
+        lb = max(lb, _resource_bound(todo, head, proc_len, proc_tail, procs))
+        if m:
+            lb = max(lb, _resource_bound(todo, head, bank_len, bank_tail, banks))
+        return lb
+
+    def dominated(placed: int, t: int, procs: List[int], banks: List[int]) -> bool:
+        nonlocal stored
+        open_ = ~placed & full
+        w = (t,) + tuple(max(x, t) for x in procs) + tuple(max(x, t) for x in banks) + tuple(
+            max(finish[i], t) for i in range(n) if placed >> i & 1 and succ_mask[i] & open_
+        )
+        seen = memo.get(placed)
+        if seen is None:
+            seen = memo[placed] = []
+        for v in seen:
+            if all(a <= b for a, b in zip(v, w)):
+                return True
+        if stored < max_states:
+            kept = [v for v in seen if not all(a <= b for a, b in zip(w, v))]
+            stored += len(kept) + 1 - len(seen)
+            kept.append(w)
+            memo[placed] = kept[-_MEMO_PER_SET:]
+        return False
+
+    root_procs = [0] * processors
+    root_banks = [0] * memory_banks
+    root_lb = bound(0, 0, root_procs, root_banks)
+    # Frame: placed set, last placement, processor and bank release times
+    # (sorted), children as (start, -level, task), next child.
+    stack: List[Tuple[int, int, List[int], List[int], List[Tuple[int, int, int]], List[int]]] = []
+
+    def enter(placed: int, t: int, procs: List[int], banks: List[int]) -> None:
+        nonlocal ub, best_starts, nodes
+        nodes += 1
+        if placed == full:
+            if procs[-1] < ub:
+                ub = procs[-1]
+                best_starts = list(start)
+            return
+        if bound(placed, t, procs, banks) >= ub or dominated(placed, t, procs, banks):
+            return
+        free = max(t, procs[0], banks[0] if m else 0)
+        children = []
+        for j in range(n):
+            if placed >> j & 1 or pred_mask[j] & ~placed:
+                continue
+            a = free
+            for d in preds[j]:
+                if finish[d] > a:
+                    a = finish[d]
+            children.append((a, -level[j], j))
+        children.sort()
+        stack.append((placed, t, procs, banks, children, [0]))
+
+    if root_lb < ub:
+        enter(0, 0, root_procs, root_banks)
+    while stack:
+        placed, t, procs, banks, children, pos = stack[-1]
+        if pos[0] == len(children):
+            stack.pop()
+            continue
+        if nodes >= max_nodes:
+            complete = False
+            break
+        a, _lvl, j = children[pos[0]]
+        pos[0] += 1
+        f = a + m + dur[j]
+        if a + level[j] >= ub:
+            continue
+        start[j] = a
+        finish[j] = f
+        child_procs = procs[1:]
+        insort(child_procs, f)
+        child_banks = banks
+        if m:
+            child_banks = banks[1:]
+            insort(child_banks, a + m)
+        enter(placed | 1 << j, a, child_procs, child_banks)
+
+    if best_starts is not None:
+        best_runs = _runs(g, best_starts, processors, m)
+    lower = ub if complete else min(ub, root_lb)
+    return ExactSchedule(ub, best_runs, complete, lower, nodes)
+
+
+def _resource_bound(todo: List[int], head: List[int], length: List[int], tail: List[int], release: List[int]) -> int:
+    # A resource with len(release) units, unit k busy until release[k]. Any
+    # set J of tasks needs sum(length) of it after h = min(head), so it is
+    # not done before the smallest C with sum_k max(0, C - max(release[k], h))
+    # >= sum(length), and then still needs min(tail). J runs over prefixes
+    # of todo by decreasing head and by decreasing tail.
+    best = 0
+    for by_head in (True, False):
+        acc = 0
+        h = q = -1
+        for j in sorted(todo, key=(head if by_head else tail).__getitem__, reverse=True):
+            acc += length[j]
+            h = head[j] if h < 0 or head[j] < h else h
+            q = tail[j] if q < 0 or tail[j] < q else q
+            lb = _fill(acc, h, release) + q
+            if lb > best:
+                best = lb
+    return best
+
+
+def _fill(work: int, h: int, release: List[int]) -> int:
+    # Water-filling: smallest C with sum_k max(0, C - max(release[k], h)) >= work.
+    if work <= 0:
+        return h
+    avail = sorted(x if x > h else h for x in release)
+    total = 0
+    for k, a in enumerate(avail):
+        total += a
+        c = -(-(work + total) // (k + 1))
+        if k + 1 == len(avail) or c <= avail[k + 1]:
+            return c
+    return h  # not reached: release is never empty
+
+
+def _topological_order(g: TaskGraph) -> List[int]:
+    # Tasks are indexed by id, and a task may depend on a later id.
+    indeg = [g.pred_ptr[i + 1] - g.pred_ptr[i] for i in range(len(g))]
+    order = [i for i, d in enumerate(indeg) if d == 0]
+    for i in order:
+        for s in g.succ[g.succ_ptr[i]:g.succ_ptr[i + 1]]:
+            indeg[s] -= 1
+            if not indeg[s]:
+                order.append(s)
+    return order
+
+
+def _runs(g: TaskGraph, starts: List[int], processors: int, mem_cost: int) -> List[TaskRun]:
+    # Replay the placement order, each task on the processor that frees up
+    # first (lowest index on ties), as the search assumed.
+    release = [0] * processors
+    runs: List[TaskRun] = []
+    for a, i in sorted((a, i) for i, a in enumerate(starts)):
+        p = min(range(processors), key=lambda q: (release[q], q))
+        release[p] = a + mem_cost + g.durations[i]
+        runs.append(TaskRun(g.ids[i], g.op(i), p, a + mem_cost, release[p]))
+    return sorted(runs, key=lambda x: (x.start, x.proc, x.task_id))
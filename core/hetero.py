@@ -0,0 +1,283 @@
+from __future__ import annotations
+from bisect import bisect_right
+from dataclasses import dataclass, field
+import heapq
+from math import ceil
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from core.schedule import PriorityFn, Task, TaskGraph, TaskRun, _priority_key, as_task_graph
+#L5
+Affinity = Dict[str, Tuple[Optional[float], ...]]
+
+
+@dataclass(frozen=True)
+class Machine:
+    """Heterogeneous dataflow machine.
+
+    A task of duration d runs on processor p in ceil(d * f / speeds[p])
+    time, where f = affinity[op][p] (1 if the op is not listed, None if the
+    op cannot run on p). An operand produced on another processor arrives
+    comm_latency later. Every task first holds a memory bank for mem_cost,
+    as in schedule_dataflow.
+    """
+
+    speeds: Tuple[float, ...]
+    memory_banks: int = 1
+    mem_cost: int = 0
+    comm_latency: int = 0
+    affinity: Affinity = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if not self.speeds:
+            raise ValueError("Machine needs at least one processor")
+        if any(s <= 0 for s in self.speeds):
+            raise ValueError("processor speeds must be > 0")
+        if self.memory_banks <= 0:
+            raise ValueError("memory_banks must be > 0")
+        if self.mem_cost < 0:
+            raise ValueError("mem_cost must be >= 0")
+        if self.comm_latency < 0:
+            raise ValueError("comm_latency must be >= 0")
+        for op, factors in self.affinity.items():
+            if len(factors) != len(self.speeds):
+                raise ValueError(f"Affinity of '{op}' needs one factor per processor")
+            if all(f is None for f in factors):
+                raise ValueError(f"'{op}' cannot run on any processor")
+            if any(f is not None and f <= 0 for f in factors):
+                raise ValueError(f"Affinity factors of '{op}' must be > 0")
+
+    @classmethod
+    def uniform(cls, processors: int, memory_banks: int = 1, mem_cost: int = 0, comm_latency: int = 0) -> "Machine":
+        """The identical-processor machine schedule_dataflow assumes."""
+        return cls((1.0,) * processors, memory_banks, mem_cost, comm_latency)
+
+    @property
+    def processors(self) -> int:
+        return len(self.speeds)
+
+    def exec_time(self, op: str, duration: int, p: int) -> Optional[int]:
+        f = self.affinity.get(op, None)
+        factor = f[p] if f is not None else 1.0
+        if factor is None:
+            return None
+        return ceil(duration * factor / self.speeds[p])
+
+
+def _exec_table(g: TaskGraph, m: Machine) -> List[List[Optional[int]]]:
+    names = [g.op_names[o] for o in g.ops]
+    return [[m.exec_time(names[i], g.durations[i], p) for p in range(m.processors)] for i in range(len(g))]
+
+
+def schedule_hetero(
+    tasks: Union[List[Task], TaskGraph],
+    machine: Machine,
+    priority: Union[str, PriorityFn, None] = None,
+) -> Tuple[int, List[TaskRun]]:
+    """schedule_dataflow on a heterogeneous machine.
+
+    Whenever processors are free, ready tasks are taken in `priority` order
+    (see schedule_dataflow; ranks use the nominal durations) and each goes
+    to the free processor where it would finish first, counting speed,
+    affinity and communication latency. A task no free processor can run
+    waits for one that can. On Machine.uniform with comm_latency 0 this is
+    exactly schedule_dataflow.
+    """
+    g = as_task_graph(tasks)
+    n = len(g)
+    m = machine
+    key = _priority_key(g, priority, m.mem_cost)
+    w = _exec_table(g, m)
+    ids = list(g.ids)
+    names = [g.op_names[o] for o in g.ops]
+    pred_ptr, pred = list(g.pred_ptr), list(g.pred)
+    succ_ptr, succ = list(g.succ_ptr), list(g.succ)
+
+    indeg = [pred_ptr[i + 1] - pred_ptr[i] for i in range(n)]
+    ready: List[Tuple[Any, int]] = [(key(i, 0) if key else i, i) for i in range(n) if indeg[i] == 0]
+    heapq.heapify(ready)
+    proc_free: List[Tuple[int, int]] = [(0, p) for p in range(m.processors)]
+    bank_free: List[Tuple[int, int]] = [(0, b) for b in range(m.memory_banks)]
+    running: List[Tuple[int, int, int]] = []
+    finish_time = [0] * n
+    proc_of = [-1] * n
+    runs: List[TaskRun] = []
+    time = 0
+    done = 0
+
+    while done < n:
+        waiting: List[Tuple[Any, int]] = []
+        while ready and proc_free:
+            entry = heapq.heappop(ready)
+            i = entry[1]
+            best: Optional[Tuple[int, int, int, int]] = None  # finish, p_time, p, start
+            for p_time, p in sorted(proc_free):
+                wi = w[i][p]
+                if wi is None:
+                    continue
+                start = max(time, p_time)
+                for k in range(pred_ptr[i], pred_ptr[i + 1]):
+                    d = pred[k]
+                    start = max(start, finish_time[d] + (m.comm_latency if proc_of[d] != p else 0))
+                if m.mem_cost:
+                    start = max(start, bank_free[0][0]) + m.mem_cost
+                cand = (start + wi, p_time, p, start)
+                if best is None or cand < best:
+                    best = cand
+            if best is None:
+                waiting.append(entry)
+                continue
+            finish, p_time, p, start = best
+            proc_free.remove((p_time, p))
+            heapq.heapify(proc_free)
+            if m.mem_cost:
+                _b_time, bank = heapq.heappop(bank_free)
+                heapq.heappush(bank_free, (start, bank))
+            proc_of[i] = p
+            runs.append(TaskRun(ids[i], names[i], p, start, finish))
+            heapq.heappush(running, (finish, i, p))
+        for entry in waiting:
+            heapq.heappush(ready, entry)
+
+        if not running:
+            raise ValueError("Task graph has a dependency cycle")
+
+        finish, i, p = heapq.heappop(running)
+        time = max(time, finish)
+        finish_time[i] = finish
+        done += 1
+        heapq.heappush(proc_free, (time, p))
+
+        for k in range(succ_ptr[i], succ_ptr[i + 1]):
+            nxt = succ[k]
+            indeg[nxt] -= 1
+            if indeg[nxt] == 0:
+                heapq.heappush(ready, (key(nxt, time) if key else nxt, nxt))
+
+    makespan = max(r.finish for r in runs) if runs else 0
+    return makespan, sorted(runs, key=lambda x: (x.start, x.proc, x.task_id))
+
+
+class _Timeline:
+    """Busy intervals of one resource, for insertion-based scheduling."""
+
+    def __init__(self) -> None:
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def earliest(self, ready: int, length: int) -> int:
+        t = ready
+        for k in range(bisect_right(self.ends, ready), len(self.starts)):
+            if self.starts[k] - t >= length:
+                return t
+            t = max(t, self.ends[k])
+        return t
+
+    def reserve(self, start: int, end: int) -> None:
+        if end > start:
+            k = bisect_right(self.starts, start)
+            self.starts.insert(k, start)
+            self.ends.insert(k, end)
+
+
+def heft_ranks(tasks: Union[List[Task], TaskGraph], machine: Machine) -> Dict[int, float]:
+    """HEFT upward rank of every task id: mean execution time over the
+    processors that can run it, plus mem_cost, plus the heaviest path of
+    mean communication and rank through its successors."""
+    g = as_task_graph(tasks)
+    return dict(zip(g.ids, _upward(g, machine, _exec_table(g, machine))))
+
+
+def _upward(g: TaskGraph, m: Machine, w: Sequence[Sequence[Optional[int]]]) -> List[float]:
+    n = len(g)
+    comm = m.comm_latency * (m.processors - 1) / m.processors
+    mean = []
+    for row in w:
+        allowed = [x for x in row if x is not None]
+        mean.append(sum(allowed) / len(allowed) + m.mem_cost)
+    outdeg = [g.succ_ptr[i + 1] - g.succ_ptr[i] for i in range(n)]
+    rank = [0.0] * n
+    stack = [i for i in range(n) if outdeg[i] == 0]
+    done = 0
+    while stack:
+        i = stack.pop()
+        best = 0.0
+        for k in range(g.succ_ptr[i], g.succ_ptr[i + 1]):
+            best = max(best, comm + rank[g.succ[k]])
+        rank[i] = mean[i] + best
+        done += 1
+        for k in range(g.pred_ptr[i], g.pred_ptr[i + 1]):
+            d = g.pred[k]
+            outdeg[d] -= 1
+            if outdeg[d] == 0:
+                stack.append(d)
+    if done != n:
+        raise ValueError("Task graph has a dependency cycle")
+    return rank
+
+
+def heft(tasks: Union[List[Task], TaskGraph], machine: Machine) -> Tuple[int, List[TaskRun]]:
+    """Heterogeneous Earliest Finish Time scheduling.
+
+    Tasks are placed in decreasing upward rank (heft_ranks), always among
+    those whose predecessors are placed, each on the processor where it
+    finishes earliest. Idle gaps on processors and memory banks are reused
+    (insertion policy), and operands from other processors arrive
+    comm_latency late.
+    """
+    g = as_task_graph(tasks)
+    n = len(g)
+    m = machine
+    w = _exec_table(g, m)
+    rank = _upward(g, m, w)
+    names = [g.op_names[o] for o in g.ops]
+    procs = [_Timeline() for _ in range(m.processors)]
+    banks = [_Timeline() for _ in range(m.memory_banks)]
+    indeg = [g.pred_ptr[i + 1] - g.pred_ptr[i] for i in range(n)]
+    ready = [(-rank[i], i) for i in range(n) if indeg[i] == 0]
+    heapq.heapify(ready)
+    finish_time = [0] * n
+    proc_of = [-1] * n
+    runs: List[TaskRun] = []
+
+    while ready:
+        _, i = heapq.heappop(ready)
+        best: Optional[Tuple[int, int, int, int]] = None  # finish, p, start, bank
+        for p in range(m.processors):
+            wi = w[i][p]
+            if wi is None:
+                continue
+            t = 0
+            for k in range(g.pred_ptr[i], g.pred_ptr[i + 1]):
+                d = g.pred[k]
+                t = max(t, finish_time[d] + (m.comm_latency if proc_of[d] != p else 0))
+            # The processor is held from the memory access to the finish;
+            # the bank only during the access.
+            bank = 0
+            while True:
+                s = procs[p].earliest(t, m.mem_cost + wi)
+                if not m.mem_cost:
+                    break
+                sb, bank = min((b.earliest(s, m.mem_cost), k) for k, b in enumerate(banks))
+                if sb == s:
+                    break
+                t = sb
+            start = s + m.mem_cost
+            cand = (start + wi, p, start, bank)
+            if best is None or cand < best:
+                best = cand
+        finish, p, start, bank = best  # type: ignore[misc]
+        procs[p].reserve(start - m.mem_cost, finish)
+        if m.mem_cost:
+            banks[bank].reserve(start - m.mem_cost, start)
+        finish_time[i] = finish
+        proc_of[i] = p
+        runs.append(TaskRun(g.ids[i], names[i], p, start, finish))
+        for k in range(g.succ_ptr[i], g.succ_ptr[i + 1]):
+            nxt = g.succ[k]
+            indeg[nxt] -= 1
+            if indeg[nxt] == 0:
+                heapq.heappush(ready, (-rank[nxt], nxt))
+
+    if len(runs) != n:
+        raise ValueError("Task graph has a dependency cycle")
+    makespan = max(r.finish for r in runs) if runs else 0
+    return makespan, sorted(runs, key=lambda x: (x.start, x.proc, x.task_id))
@@ -0,0 +1,258 @@
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Optional, Tuple
+from core.ast import Node, is_leaf
+from core.equivalence import replace_subtree
+from core.schedule import (
+    ScheduleLog,
+    TaskGraph,
+    TaskRun,
+    _levels,
+    _list_schedule,
+    _op_duration,
+    _postorder_ops,
+    _resume_state,
+    build_task_graph,
+    sequential_time,
+)
+#L6
+
+
+class FormEval:
+    """A form with its task graph (as build_task_graph) and the logged
+    schedule_dataflow run under the default "id" priority.
+
+    evaluate_rewrite derives a neighbour's FormEval from this one. The
+    node index and dispatch positions it needs are built on first use, so
+    evaluations that are never rewritten do not pay for them.
+    """
+
+    def __init__(
+        self,
+        form: Node,
+        graph: TaskGraph,
+        processors: int,
+        memory_banks: int,
+        mem_cost: int,
+        op_cost: Dict[str, int],
+        makespan: int,
+        runs: List[TaskRun],
+        log: ScheduleLog,
+        t1: int,
+    ) -> None:
+        self.form = form
+        self.graph = graph
+        self.processors = processors
+        self.memory_banks = memory_banks
+        self.mem_cost = mem_cost
+        self.op_cost = op_cost
+        self.makespan = makespan
+        self.runs = runs
+        self.log = log
+        self.t1 = t1
+        self._index: Optional[Tuple[Dict[int, int], List[int], Dict[int, Tuple[Node, int]]]] = None
+        self._first_dispatch: Optional[List[int]] = None
+
+    def result(self) -> Tuple[int, int, float, float, int]:
+        """(Tp, T1, S, E, ops), as lab6.eval_form."""
+        s = (self.t1 / self.makespan) if self.makespan > 0 else 0.0
+        e = (s / self.processors) if self.processors > 0 else 0.0
+        return self.makespan, self.t1, s, e, len(self.graph)
+
+    @property
+    def levels(self) -> List[int]:
+        """Bottom level of every task, incl. memory access."""
+        return _levels(self.graph, self.mem_cost)
+
+    @property
+    def critical_path(self) -> int:
+        return max(self.levels, default=0)
+
+    def _nodes(self) -> Tuple[Dict[int, int], List[int], Dict[int, Tuple[Node, int]]]:
+        # Task index and first index of the subtree of every operation node,
+        # keyed by id(); -1 for nodes that occur more than once. `up` maps a
+        # node to its parent and side, for path copying.
+        if self._index is not None:
+            return self._index
+        index: Dict[int, int] = {}
+        first: List[int] = []
+        up: Dict[int, Tuple[Node, int]] = {}
+        stack: List[Tuple[Node, bool]] = [(self.form, False)]
+        starts: List[int] = []
+        while stack:
+            x, expanded = stack.pop()
+            if is_leaf(x):
+                continue
+            if not expanded:
+                starts.append(len(first))
+                stack.append((x, True))
+                if x.right:
+                    up[id(x.right)] = (x, 1)
+                    stack.append((x.right, False))
+                if x.left:
+                    up[id(x.left)] = (x, 0)
+                    stack.append((x.left, False))
+                continue
+            i = len(first)
+            first.append(starts.pop())
+            index[id(x)] = -1 if id(x) in index else i
+        self._index = (index, first, up)
+        return self._index
+
+    def _dispatch_from(self, a0: int) -> int:
+        # Position in the log of the first dispatch of a task with index >= a0.
+        if self._first_dispatch is None:
+            n = len(self.graph)
+            pos = [0] * n
+            for k, i in enumerate(self.log.order):
+                pos[i] = k
+            suffix = [len(self.log.order)] * (n + 1)
+            for i in range(n - 1, -1, -1):
+                suffix[i] = min(pos[i], suffix[i + 1])
+            self._first_dispatch = suffix
+        return self._first_dispatch[a0]
+
+
+def evaluate(form: Node, processors: int, memory_banks: int, mem_cost: int, op_cost: Dict[str, int]) -> FormEval:
+    """Full evaluation of form, logged so that it can seed evaluate_rewrite."""
+    if processors <= 0:
+        raise ValueError("processors must be > 0")
+    if memory_banks <= 0:
+        raise ValueError("memory_banks must be > 0")
+    if mem_cost < 0:
+        raise ValueError("mem_cost must be >= 0")
+    g = build_task_graph(form, op_cost)
+    log = ScheduleLog()
+    makespan, runs = _list_schedule(g, processors, memory_banks, mem_cost, None, log)
+    return FormEval(form, g, processors, memory_banks, mem_cost, op_cost, makespan, runs, log, sequential_time(g))
+
+
+def _shift(seq: array, at: int, delta: int) -> array:
+    return array("i", (v + delta if v >= at else v for v in seq))
+
+
+def rewrite_form(parent: FormEval, target: Node, replacement: Node) -> Node:
+    """parent.form with target replaced, as replace_subtree.
+
+    An operation node that occurs once is replaced by copying only the path
+    from it to the root; the result shares every other subtree, and their
+    cached structural keys, with parent.form.
+    """
+    index, _first, up = parent._nodes()
+    if is_leaf(target) or index.get(id(target), -1) < 0:
+        return replace_subtree(parent.form, target, replacement)
+    form = replacement
+    x = target
+    while id(x) in up:
+        par, side = up[id(x)]
+        form = Node(par.value, form, par.right) if side == 0 else Node(par.value, par.left, form)
+        x = par
+    return form
+
+
+def evaluate_rewrite(
+    parent: FormEval,
+    target: Node,
+    replacement: Node,
+    form: Optional[Node] = None,
+) -> FormEval:
+    """Evaluate parent.form with the subtree target replaced.
+
+    The rewritten subtree occupies one contiguous block of postorder task
+    ids, so the child graph is the parent's arrays with that block spliced
+    out and the new one spliced in. The tasks before the block are
+    unchanged, and under the "id" priority so is every dispatch made
+    before the first task of the block or after it is dispatched: the
+    simulation resumes from that point of the parent's log. In a tree the
+    bottom level of a task only depends on its ancestors, so if the parent
+    has levels only those of the new block are computed.
+
+    The result is identical to evaluate() on the rewritten form, which is
+    also the fallback when target is a leaf, occurs more than once, or is
+    replaced by a leaf. form, if given, must be
+    rewrite_form(parent, target, replacement).
+    """
+    if form is None:
+        form = rewrite_form(parent, target, replacement)
+    index, first, _up = parent._nodes()
+    b0 = index.get(id(target), -1) if not is_leaf(target) else -1
+    if b0 < 0 or is_leaf(replacement):
+        return evaluate(form, parent.processors, parent.memory_banks, parent.mem_cost, parent.op_cost)
+
+    g = parent.graph
+    a0 = first[b0]
+    block, _saved = _postorder_ops(replacement)
+    k = len(block)
+    delta = k - (b0 - a0 + 1)
+    n = len(g) + delta
+
+    op_index = {name: c for c, name in enumerate(g.op_names)}
+    names = list(g.op_names)
+    codes = array("H")
+    durs = array("i")
+    block_pred_ptr = array("i")
+    block_pred = array("i")
+    block_succ: List[List[int]] = [[] for _ in range(k)]
+    base = g.pred_ptr[a0]
+    for j, (node, dl, dr) in enumerate(block):
+        code = op_index.get(node.value)
+        if code is None:
+            _op_duration(parent.op_cost, node.value)
+            code = op_index[node.value] = len(names)
+            names.append(node.value)
+        codes.append(code)
+        durs.append(int(parent.op_cost[node.value]))
+        for d in sorted({d for d in (dl, dr) if d is not None}):
+            block_pred.append(a0 + d - 1)
+            block_succ[d - 1].append(a0 + j)
+        block_pred_ptr.append(base + len(block_pred))
+    # The block root keeps the parent's successor, shifted like the tail.
+    block_succ[k - 1] = [v + delta for v in g.succ[g.succ_ptr[b0]:g.succ_ptr[b0 + 1]]]
+
+    pred_end = g.pred_ptr[b0 + 1]
+    pred_ptr = g.pred_ptr[:a0 + 1] + block_pred_ptr + _shift(g.pred_ptr[b0 + 2:], 0, base + len(block_pred) - pred_end)
+    pred = g.pred[:base] + block_pred + _shift(g.pred[pred_end:], b0, delta)
+
+    succ_base = g.succ_ptr[a0]
+    block_succ_ptr = array("i")
+    block_succ_flat = array("i")
+    for s in block_succ:
+        block_succ_flat.extend(s)
+        block_succ_ptr.append(succ_base + len(block_succ_flat))
+    succ_end = g.succ_ptr[b0 + 1]
+    succ_ptr = g.succ_ptr[:a0 + 1] + block_succ_ptr + _shift(g.succ_ptr[b0 + 2:], 0, succ_base + len(block_succ_flat) - succ_end)
+    succ = _shift(g.succ[:succ_base], b0 + 1, delta) + block_succ_flat + _shift(g.succ[succ_end:], b0 + 1, delta)
+
+    child = TaskGraph(
+        array("i", range(1, n + 1)),
+        g.ops[:a0] + codes + g.ops[b0 + 1:],
+        names,
+        g.durations[:a0] + durs + g.durations[b0 + 1:],
+        pred_ptr,
+        pred,
+        succ_ptr,
+        succ,
+    )
+
+    mem = parent.mem_cost
+    old_levels = g.cache.get(("levels", mem))
+    if old_levels is not None:
+        levels = old_levels[:a0] + [0] * k + old_levels[b0 + 1:]
+        for i in range(a0 + k - 1, a0 - 1, -1):
+            best = 0
+            for s in range(succ_ptr[i], succ_ptr[i + 1]):
+                best = max(best, levels[succ[s]])
+            levels[i] = child.durations[i] + mem + best
+        child.cache[("levels", mem)] = levels
+
+    d = parent._dispatch_from(a0)
+    state = _resume_state(child, parent.log, d, parent.processors, parent.memory_banks)
+    log = ScheduleLog()
+    log.order = parent.log.order[:d]
+    log.banks = parent.log.banks[:d]
+    log.done_before = parent.log.done_before[:d]
+    log.completions = parent.log.completions[:state[-1]]
+    log.runs = parent.log.runs[:d]
+    makespan, runs = _list_schedule(child, parent.processors, parent.memory_banks, mem, None, log, state)
+    t1 = parent.t1 - sum(g.durations[a0:b0 + 1]) + sum(durs)
+    return FormEval(form, child, parent.processors, parent.memory_banks, mem, parent.op_cost, makespan, runs, log, t1)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from itertools import count
+from typing import Dict, Iterator, List, Optional, Tuple
+from .ast import Node, is_leaf
+#L_3_4
+Signature = Tuple[str, int, int]
+
+# Keys are (epoch << _EPOCH_SHIFT) | index into the table of the epoch.
+# Every table (see key_scope) has its own epoch, so keys of different
+# tables never collide and a key cached on a node from another table is
+# recognised as stale.
+_EPOCH_SHIFT = 32
+_EPOCHS = count()
+_KEYS: Dict[Signature, int] = {}
+_epoch = next(_EPOCHS)
+
+
+def _signature(value: str, left: Optional[Node], right: Optional[Node]) -> Signature:
+    lk = left.key if left is not None else -1
+    rk = right.key if right is not None else -1
+    return (value, lk, rk)
+
+
+def _key_for(sig: Signature) -> int:
+    k = _KEYS.get(sig)
+    if k is None:
+        k = _epoch << _EPOCH_SHIFT | len(_KEYS)
+        _KEYS[sig] = k
+    return k
+
+
+def _current(k: Optional[int]) -> bool:
+    return k is not None and k >> _EPOCH_SHIFT == _epoch
+
+
+@contextmanager
+def key_scope() -> Iterator[None]:
+    """Give structural_key a fresh key table for the block and release it
+    on exit.
+
+    Keys handed out in the block are not valid outside it, so seen sets,
+    EvalCaches and generators that use them must not outlive the block.
+    The enclosing table is left as it was: nodes keyed in the block get
+    their old keys back on the next structural_key call. Scopes must nest,
+    and the table is shared by all threads.
+    """
+    global _KEYS, _epoch
+    outer = (_KEYS, _epoch)
+    _KEYS, _epoch = {}, next(_EPOCHS)
+    try:
+        yield
+    finally:
+        _KEYS, _epoch = outer
+
+
+def structural_key(n: Node) -> int:
+    """Canonical id of the subtree rooted at n.
+
+    Two subtrees get the same key iff they are structurally equal. Keys are
+    computed bottom-up once and cached on every visited node. They belong
+    to the current key table (see key_scope).
+    """
+    if _current(n.key):
+        return n.key  # type: ignore[return-value]
+    stack: List[Node] = [n]
+    while stack:
+        x = stack[-1]
+        if _current(x.key):
+            stack.pop()
+            continue
+        if x.left is not None and not _current(x.left.key):
+            stack.append(x.left)
+            continue
+        if x.right is not None and not _current(x.right.key):
+            stack.append(x.right)
+            continue
+        # object.__setattr__ also re-keys SharedNodes from another table.
+        object.__setattr__(x, "key", _key_for(_signature(x.value, x.left, x.right)))
+        stack.pop()
+    return n.key  # type: ignore[return-value]
+
+
+class SharedNode(Node):
+    __hash__ = object.__hash__
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("interned nodes are immutable")
+
+
+class NodeStore:
+    """Hash-consing factory: structurally equal subtrees share one node.
+
+    Nodes handed out by a store are immutable and may appear several times
+    in the same tree, so they must not be passed to code that relies on
+    node identity being unique within a tree.
+
+    A store only shares nodes made under one key table: when key_scope
+    switches tables its nodes are dropped, and stay valid trees that are no
+    longer shared with new ones.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: Dict[int, SharedNode] = {}
+        self._epoch = _epoch
+
+    def _sync(self) -> None:
+        if self._epoch != _epoch:
+            self._nodes.clear()
+            self._epoch = _epoch
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._nodes)
+
+    def __contains__(self, n: Node) -> bool:
+        self._sync()
+        return n.key is not None and self._nodes.get(n.key) is n
+
+    def clear(self) -> None:
+        self._nodes.clear()
+
+    def make(self, value: str, left: Optional[Node] = None, right: Optional[Node] = None) -> Node:
+        self._sync()
+        if left is not None and left not in self:
+            left = self.intern(left)
+        if right is not None and right not in self:
+            right = self.intern(right)
+        k = _key_for(_signature(value, left, right))
+        n = self._nodes.get(k)
+        if n is None:
+            n = object.__new__(SharedNode)
+            object.__setattr__(n, "value", value)
+            object.__setattr__(n, "left", left)
+            object.__setattr__(n, "right", right)
+            object.__setattr__(n, "key", k)
+            self._nodes[k] = n
+        return n
+
+    def intern(self, root: Node) -> Node:
+        if root in self:
+            return root
+        done: Dict[int, Node] = {}
+        stack: List[Tuple[Node, bool]] = [(root, False)]
+        while stack:
+            x, expanded = stack.pop()
+            if id(x) in done:
+                continue
+            if x in self:
+                done[id(x)] = x
+                continue
+            if is_leaf(x):
+                done[id(x)] = self.make(x.value)
+                continue
+            if not expanded:
+                stack.append((x, True))
+                if x.right is not None:
+                    stack.append((x.right, False))
+                if x.left is not None:
+                    stack.append((x.left, False))
+                continue
+            left = done[id(x.left)] if x.left is not None else None
+            right = done[id(x.right)] if x.right is not None else None
+            done[id(x)] = self.make(x.value, left, right)
+        return done[id(root)]
@@ -0,0 +1,181 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from math import exp
+import random
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from core.ast import Node, is_leaf
+from core.equivalence import collect_chain_assoc, count_assoc_trees, dist_rewrites_at_node, iter_nodes, unrank_assoc_tree
+from core.incremental import FormEval, evaluate, evaluate_rewrite, rewrite_form
+from core.intern import structural_key
+#L6
+Result = Tuple[int, int, float, float, int]  # (Tp, T1, S, E, ops), as lab6.eval_form
+
+
+def _rank(r: Result) -> Tuple[int, float, int]:
+    return (r[0], -r[3], r[4])
+
+
+@dataclass
+class SearchTrace:
+    """Outcome of one metaheuristic run. improvements lists every new best
+    form in the order found, starting with the start form."""
+
+    best: Node
+    result: Result
+    evaluations: int = 0
+    accepted: int = 0
+    improvements: List[Tuple[Node, Result]] = field(default_factory=list)
+
+    def offer(self, form: Node, r: Result) -> None:
+        if _rank(r) < _rank(self.result):
+            self.best = form
+            self.result = r
+            self.improvements.append((form, r))
+
+
+def random_move(root: Node, rng: random.Random, attempts: int = 32) -> Optional[Tuple[Node, Node]]:
+    """One random neighbour of root as a (target, replacement) rewrite.
+
+    The move set is that of lab6.neighbors_once: a different bracketing of
+    the +/* chain at an operation node, or one of dist_rewrites_at_node.
+    A node is drawn uniformly, then a move kind available there, then a
+    move of that kind; bracketings are drawn with unrank_assoc_tree, so no
+    neighbour list is built. None if no move was found in `attempts` tries.
+    """
+    ops = [x for x in iter_nodes(root) if not is_leaf(x)]
+    if not ops:
+        return None
+    for _ in range(attempts):
+        node = rng.choice(ops)
+        chain = collect_chain_assoc(node, node.value) if node.value in {"+", "*"} else []
+        dist = dist_rewrites_at_node(node)
+        kinds = (["assoc"] if len(chain) >= 3 else []) + (["dist"] if dist else [])
+        if not kinds:
+            continue
+        if rng.choice(kinds) == "dist":
+            return node, rng.choice(dist)
+        count = count_assoc_trees(len(chain))
+        current = structural_key(node)
+        for _ in range(attempts):
+            v = unrank_assoc_tree(node.value, chain, rng.randrange(count))
+            if structural_key(v) != current:
+                return node, v
+    return None
+
+
+def simulated_annealing(
+    start: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    max_evals: int = 1000,
+    seed: Optional[int] = None,
+    t_start: Optional[float] = None,
+    t_end: float = 0.05,
+) -> SearchTrace:
+    """Simulated annealing on Tp over random_move.
+
+    A move that does not increase Tp is always taken, one that increases it
+    by d with probability exp(-d / T). T cools geometrically from t_start
+    (default 10% of the start Tp, at least 1) to t_end over max_evals
+    evaluations. Moves are evaluated incrementally (core.incremental).
+    """
+    if max_evals <= 0:
+        raise ValueError("max_evals must be > 0")
+    rng = random.Random(seed)
+    cur = evaluate(start, p, memory_banks, mem_cost, op_cost)
+    cur_r = cur.result()
+    trace = SearchTrace(start, cur_r, 1, 0, [(start, cur_r)])
+    t0 = t_start if t_start is not None else max(1.0, 0.1 * cur_r[0])
+    if t0 <= 0 or t_end <= 0:
+        raise ValueError("temperatures must be > 0")
+    steps = max_evals - 1
+    for step in range(steps):
+        temp = t0 * (t_end / t0) ** (step / max(1, steps - 1))
+        move = random_move(cur.form, rng)
+        if move is None:
+            break
+        nxt = evaluate_rewrite(cur, *move)
+        r = nxt.result()
+        trace.evaluations += 1
+        d = r[0] - cur_r[0]
+        if d <= 0 or rng.random() < exp(-d / temp):
+            cur, cur_r = nxt, r
+            trace.accepted += 1
+            trace.offer(cur.form, r)
+    return trace
+
+
+def tabu_search(
+    start: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    max_evals: int = 1000,
+    seed: Optional[int] = None,
+    tenure: int = 50,
+    sample_size: int = 16,
+    max_stalls: int = 10,
+) -> SearchTrace:
+    """Tabu search over random_move.
+
+    Each step evaluates up to sample_size distinct random neighbours that
+    are not among the last `tenure` forms visited, and moves to the best
+    of them even if it is worse. Stops after max_evals evaluations, or
+    after max_stalls steps in a row without an admissible neighbour.
+    """
+    if max_evals <= 0:
+        raise ValueError("max_evals must be > 0")
+    if tenure < 0 or sample_size <= 0:
+        raise ValueError("tenure must be >= 0 and sample_size > 0")
+    rng = random.Random(seed)
+    cur: FormEval = evaluate(start, p, memory_banks, mem_cost, op_cost)
+    trace = SearchTrace(start, cur.result(), 1, 0, [(start, cur.result())])
+    tabu: Deque[int] = deque()
+    tabu_set: Set[int] = set()
+
+    def visit(form: Node) -> None:
+        k = structural_key(form)
+        tabu.append(k)
+        tabu_set.add(k)
+        if len(tabu) > tenure:
+            tabu_set.discard(tabu.popleft())
+
+    visit(start)
+    stalls = 0
+    while trace.evaluations < max_evals and stalls < max_stalls:
+        step: Optional[Tuple[Tuple[int, float, int], FormEval]] = None
+        sampled: Set[int] = set()
+        for _ in range(sample_size):
+            if trace.evaluations >= max_evals:
+                break
+            move = random_move(cur.form, rng)
+            if move is None:
+                break
+            nb = rewrite_form(cur, *move)
+            k = structural_key(nb)
+            if k in tabu_set or k in sampled:
+                continue
+            sampled.add(k)
+            ce = evaluate_rewrite(cur, move[0], move[1], nb)
+            trace.evaluations += 1
+            if step is None or _rank(ce.result()) < step[0]:
+                step = (_rank(ce.result()), ce)
+        if step is None:
+            stalls += 1
+            continue
+        stalls = 0
+        cur = step[1]
+        trace.accepted += 1
+        visit(cur.form)
+        trace.offer(cur.form, cur.result())
+    return trace
+
+
+METHODS: Dict[str, Callable[..., SearchTrace]] = {
+    "anneal": simulated_annealing,
+    "tabu": tabu_search,
+}
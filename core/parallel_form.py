@@ -1,16 +1,18 @@
 from __future__ import annotations
-from typing import List
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple, Union
 from .ast import Node, is_leaf
 #L2
 def collect_chain(n: Node, op: str) -> List[Node]:
     items: List[Node] = []
-    def dfs(x: Node) -> None:
+    stack: List[Node] = [n]
+    while stack:
+        x = stack.pop()
         if x.value == op and x.left and x.right:
-            dfs(x.left)
-            dfs(x.right)
+            stack.append(x.right)
+            stack.append(x.left)
         else:
             items.append(x)
-    dfs(n)
     return items
 
 def build_balanced(op: str, operands: List[Node]) -> Node:
@@ -30,35 +32,43 @@ def build_balanced(op: str, operands: List[Node]) -> Node:
         nodes = nxt
     return nodes[0]
 
-def flatten_plus_mul(n: Node) -> Node:
-    if is_leaf(n):
-        return n
-    left = flatten_plus_mul(n.left) if n.left else None
-    right = flatten_plus_mul(n.right) if n.right else None
-    cur = Node(n.value, left, right)
-    if cur.value in {"+", "*"}:
-        ops = [flatten_plus_mul(x) for x in collect_chain(cur, cur.value)]
-        return build_balanced(cur.value, ops)
-    return cur
+def _rebuild_postorder(n: Node, combine: Callable[[Node, Optional[Node], Optional[Node]], Node]) -> Node:
+    # Leaves are kept as they are; every inner node is rebuilt bottom-up by
+    # combine(original, new_left, new_right) using an explicit stack.
+    results: List[Node] = []
+    stack: List[Tuple[Node, bool]] = [(n, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if is_leaf(x):
+            results.append(x)
+            continue
+        if not expanded:
+            stack.append((x, True))
+            if x.right:
+                stack.append((x.right, False))
+            if x.left:
+                stack.append((x.left, False))
+            continue
+        right = results.pop() if x.right else None
+        left = results.pop() if x.left else None
+        results.append(combine(x, left, right))
+    return results[0]
 
-def rewrite_div_chain(n: Node) -> Node:
-    if is_leaf(n):
-        return n
-    left = rewrite_div_chain(n.left) if n.left else None
-    right = rewrite_div_chain(n.right) if n.right else None
+def _peel(x: Node, op: str) -> Tuple[Node, List[Node]]:
+    rest: List[Node] = []
+    while x.value == op and x.left and x.right:
+        rest.append(x.right)
+        x = x.left
+    return x, rest
+
+# Children are rewritten before their parent, so a peeled chain stops after
+# at most one already-normalised level and items need no second pass.
+def _div_node(n: Node, left: Optional[Node], right: Optional[Node]) -> Node:
     cur = Node(n.value, left, right)
     if cur.value != "/":
         return cur
 
-    denoms: List[Node] = []
-    def peel(x: Node) -> Node:
-        if x.value == "/" and x.left and x.right:
-            denoms.append(x.right)
-            return peel(x.left)
-        return x
-
-    num = peel(cur)
-    denoms = [rewrite_div_chain(d) for d in denoms]
+    num, denoms = _peel(cur, "/")
 
     if len(denoms) == 0:
         return num
@@ -68,24 +78,12 @@ def rewrite_div_chain(n: Node) -> Node:
     denom_mul = build_balanced("*", denoms)
     return Node("/", num, denom_mul)
 
-def rewrite_sub_chain(n: Node) -> Node:
-    if is_leaf(n):
-        return n
-    left = rewrite_sub_chain(n.left) if n.left else None
-    right = rewrite_sub_chain(n.right) if n.right else None
+def _sub_node(n: Node, left: Optional[Node], right: Optional[Node]) -> Node:
     cur = Node(n.value, left, right)
     if cur.value != "-":
         return cur
 
-    subs: List[Node] = []
-    def peel(x: Node) -> Node:
-        if x.value == "-" and x.left and x.right:
-            subs.append(x.right)
-            return peel(x.left)
-        return x
-
-    a = peel(cur)
-    subs = [rewrite_sub_chain(x) for x in subs]
+    a, subs = _peel(cur, "-")
 
     if len(subs) == 0:
         return a
@@ -95,8 +93,154 @@ def rewrite_sub_chain(n: Node) -> Node:
     sum_node = build_balanced("+", subs)
     return Node("-", a, sum_node)
 
+def flatten_plus_mul(n: Node) -> Node:
+    # A +/* chain is collected once, from its topmost node, and each item is
+    # flattened before the chain is rebuilt balanced. The inner chain nodes
+    # would only be re-collected by their parent, so they are never built.
+    results: List[Node] = []
+    stack: List[Tuple[Node, Optional[List[Node]]]] = [(n, None)]
+    while stack:
+        x, kids = stack.pop()
+        if kids is None:
+            if is_leaf(x):
+                results.append(x)
+                continue
+            if x.value in {"+", "*"} and x.left and x.right:
+                kids = collect_chain(x, x.value)
+            else:
+                kids = [c for c in (x.left, x.right) if c]
+            stack.append((x, kids))
+            for c in reversed(kids):
+                stack.append((c, None))
+            continue
+        parts = results[len(results) - len(kids):]
+        del results[len(results) - len(kids):]
+        if x.value in {"+", "*"} and x.left and x.right:
+            results.append(build_balanced(x.value, parts))
+        else:
+            left = parts.pop(0) if x.left else None
+            right = parts.pop(0) if x.right else None
+            results.append(Node(x.value, left, right))
+    return results[0]
+
+def rewrite_div_chain(n: Node) -> Node:
+    return _rebuild_postorder(n, _div_node)
+
+def rewrite_sub_chain(n: Node) -> Node:
+    return _rebuild_postorder(n, _sub_node)
+
+class _Chain:
+    """Pending balanced +/* chain: its items in order, and an existing node
+    already equal to build_balanced(op, items) if there is one."""
+
+    __slots__ = ("op", "items", "node")
+
+    def __init__(self, op: str, items: Deque[Node], node: Optional[Node]) -> None:
+        self.op = op
+        self.items = items
+        self.node = node
+
+    def materialize(self) -> Node:
+        if self.node is None:
+            self.node = build_balanced(self.op, list(self.items))
+        return self.node
+
+
+class _Tail:
+    """Pending a / (denominator product) or a - (sum of subtrahends); src is
+    the input node to reuse if neither side changed."""
+
+    __slots__ = ("op", "first", "rest", "src")
+
+    def __init__(self, op: str, first: Node, rest: _Chain, src: Optional[Node]) -> None:
+        self.op = op
+        self.first = first
+        self.rest = rest
+        self.src = src
+
+    def materialize(self) -> Node:
+        rest = self.rest.materialize()
+        if self.src is not None and self.src.left is self.first and self.src.right is rest:
+            return self.src
+        return Node(self.op, self.first, rest)
+
+
+_Pending = Union[Node, _Chain, _Tail]
+_TAIL_OF = {"/": "*", "-": "+"}
+
+
+def _materialize(p: _Pending) -> Node:
+    return p if isinstance(p, Node) else p.materialize()
+
+
+def _chain_view(op: str, p: _Pending) -> _Chain:
+    if isinstance(p, _Chain) and p.op == op:
+        return p
+    n = _materialize(p)
+    return _Chain(op, deque((n,)), n)
+
+
+def _concat(a: Deque[Node], b: Deque[Node]) -> Deque[Node]:
+    # Small-to-large, so merging every chain of the tree stays near-linear.
+    if len(a) >= len(b):
+        a.extend(b)
+        return a
+    b.extendleft(reversed(a))
+    return b
+
+
+def _fused_node(x: Node, left: Optional[_Pending], right: Optional[_Pending]) -> _Pending:
+    if left is None or right is None:
+        l = _materialize(left) if left is not None else None
+        r = _materialize(right) if right is not None else None
+        return x if (l is x.left and r is x.right) else Node(x.value, l, r)
+
+    op = x.value
+    if op in {"+", "*"}:
+        lc = _chain_view(op, left)
+        rc = _chain_view(op, right)
+        n = len(lc.items) + len(rc.items)
+        # build_balanced puts the largest power of two below n on the left.
+        same = lc.node is x.left and rc.node is x.right and len(lc.items) == 1 << ((n - 1).bit_length() - 1)
+        return _Chain(op, _concat(lc.items, rc.items), x if same else None)
+
+    tail = _TAIL_OF.get(op)
+    if tail is not None:
+        rc = _chain_view(tail, right)
+        if isinstance(left, _Tail) and left.op == op:
+            # (a op q) op b  ->  a op (b tail q)
+            return _Tail(op, left.first, _Chain(tail, _concat(rc.items, left.rest.items), None), None)
+        return _Tail(op, _materialize(left), rc, x)
+
+    l = _materialize(left)
+    r = _materialize(right)
+    return x if (l is x.left and r is x.right) else Node(op, l, r)
+
+
 def build_parallel_form(ast: Node) -> Node:
-    t1 = rewrite_div_chain(ast)
-    t2 = rewrite_sub_chain(t1)
-    t3 = flatten_plus_mul(t2)
-    return t3
+    """rewrite_div_chain, rewrite_sub_chain and flatten_plus_mul fused into
+    one post-order pass.
+
+    Chains are carried up as pending item lists and only built once, at the
+    node that stops them, so the pass is near-linear on any tree shape.
+    Subtrees that the three passes would leave unchanged are shared with
+    ast instead of copied.
+    """
+    results: List[Optional[_Pending]] = []
+    stack: List[Tuple[Node, bool]] = [(ast, False)]
+    while stack:
+        x, expanded = stack.pop()
+        if is_leaf(x):
+            results.append(x)
+            continue
+        if not expanded:
+            stack.append((x, True))
+            if x.right:
+                stack.append((x.right, False))
+            if x.left:
+                stack.append((x.left, False))
+            continue
+        right = results.pop() if x.right else None
+        left = results.pop() if x.left else None
+        results.append(_fused_node(x, left, right))
+    return _materialize(results[0])
@@ -1,7 +1,13 @@
 from __future__ import annotations
-from typing import List, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+import os
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from .ast import Node, OPS
-from .tokenize import tokenize
+from .equivalence import to_postfix
+from .tokenize import ParseError, Source, Token, iter_tokens
 
 PREC = {"+": 1, "-": 1, "*": 2, "/": 2}
 ASSOC = {"+": "L", "-": "L", "*": "L", "/": "L"}
@@ -55,5 +61,266 @@ def rpn_to_ast(rpn: List[str]) -> Node:
         raise ValueError("Invalid expression")
     return st[0]
 
-def parse_expression(expr: str) -> Node:
-    return rpn_to_ast(to_rpn(tokenize(expr)))
+def _reduce(nodes: List[Node], op: Token, invalid: Optional[int]) -> Optional[int]:
+    # Once an operator has been short of operands the tree is never returned,
+    # so later reductions are skipped and only the first position is kept.
+    if invalid is not None:
+        return invalid
+    if len(nodes) < 2:
+        return op[1]
+    b = nodes.pop()
+    nodes[-1] = Node(op[0], nodes[-1], b)
+    return None
+
+def parse_expression(expr: Source) -> Node:
+    """Parse a str, bytes-like or file object into an AST in one pass.
+
+    Tokens from iter_tokens go straight through the shunting-yard and every
+    operator is reduced into a Node as soon as it leaves the operator stack,
+    so no token or RPN list is kept: besides the tree only O(depth) stacks
+    are held. Errors are ParseError with the offending position; as with
+    rpn_to_ast(to_rpn(tokenize(expr))), tokenizer errors anywhere in the
+    input win over parenthesis errors, which win over operand errors.
+    """
+    nodes: List[Node] = []
+    stack: List[Token] = []
+    prev: Optional[str] = None
+    invalid: Optional[int] = None
+    mismatch: Optional[int] = None
+    end = 0
+
+    for tok, pos in iter_tokens(expr):
+        end = pos + len(tok)
+        if mismatch is not None:
+            continue
+        if tok not in OPS and tok not in {"(", ")"}:
+            nodes.append(Node(tok))
+        elif tok in OPS:
+            if tok == "-" and (prev is None or prev in OPS or prev == "("):
+                nodes.append(Node("0"))
+            while stack and stack[-1][0] in OPS:
+                top = stack[-1][0]
+                if (PREC[top] > PREC[tok]) or (PREC[top] == PREC[tok] and ASSOC[tok] == "L"):
+                    invalid = _reduce(nodes, stack.pop(), invalid)
+                else:
+                    break
+            stack.append((tok, pos))
+        elif tok == "(":
+            stack.append((tok, pos))
+        else:
+            while stack and stack[-1][0] != "(":
+                invalid = _reduce(nodes, stack.pop(), invalid)
+            if not stack:
+                mismatch = pos
+                continue
+            stack.pop()
+        prev = tok
+
+    if mismatch is not None:
+        raise ParseError("Mismatched parentheses", mismatch)
+    while stack:
+        if stack[-1][0] in {"(", ")"}:
+            raise ParseError("Mismatched parentheses", stack[-1][1])
+        invalid = _reduce(nodes, stack.pop(), invalid)
+    if invalid is not None:
+        raise ParseError("Invalid expression", invalid)
+    if len(nodes) != 1:
+        raise ParseError("Invalid expression", end)
+    return nodes[0]
+
+
+class ParseCache:
+    """Size-bounded LRU of parsed trees.
+
+    Spaces never matter to the tokenizer, so entries are keyed on the text
+    with spaces removed. Trees are shared between callers and must not be
+    mutated. Only successful parses are cached.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be > 0")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._trees: OrderedDict[str, Node] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._trees)
+
+    def clear(self) -> None:
+        self._trees.clear()
+
+    def get(self, expr: str) -> Optional[Node]:
+        key = expr.replace(" ", "")
+        tree = self._trees.get(key)
+        if tree is None:
+            self.misses += 1
+            return None
+        self._trees.move_to_end(key)
+        self.hits += 1
+        return tree
+
+    def put(self, expr: str, tree: Node) -> None:
+        key = expr.replace(" ", "")
+        self._trees[key] = tree
+        self._trees.move_to_end(key)
+        while len(self._trees) > self.maxsize:
+            self._trees.popitem(last=False)
+
+    def parse(self, expr: str) -> Node:
+        tree = self.get(expr)
+        if tree is None:
+            tree = parse_expression(expr)
+            self.put(expr, tree)
+        return tree
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._trees),
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+@dataclass(frozen=True)
+class ParseResult:
+    index: int
+    expr: str
+    tree: Optional[Node] = None
+    postfix: Optional[Tuple[str, ...]] = None
+    error: Optional[str] = None
+    pos: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+_Parsed = Tuple[Optional[Tuple[str, ...]], Optional[str], Optional[int]]
+
+
+def _parse_batch(texts: List[str]) -> List[_Parsed]:
+    out: List[_Parsed] = []
+    for text in texts:
+        try:
+            out.append((tuple(to_postfix(parse_expression(text))), None, None))
+        except ParseError as e:
+            out.append((None, str(e), e.pos))
+    return out
+
+
+def _read_lines(path: os.PathLike[str]) -> Iterator[Tuple[int, str]]:
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.rstrip("\r\n")
+            if line.strip():
+                yield i, line
+
+
+def iter_parse_many(
+    exprs: Union[Iterable[str], os.PathLike[str]],
+    serialized: bool = False,
+    cache: Optional[ParseCache] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    batch: int = 1024,
+) -> Iterator[ParseResult]:
+    """Parse many expressions, yielding one ParseResult each, in input order.
+
+    exprs is an iterable of expressions or the os.PathLike path (e.g. a
+    pathlib.Path) of a file with one expression per line; blank lines are
+    skipped and index is then the 0-based line number. A bare str is
+    rejected with TypeError, as it could be either. A failing expression yields a result with error and
+    pos set instead of aborting the batch. With serialized=True results hold
+    postfix token tuples (see core.parse.rpn_to_ast) instead of trees.
+
+    Input is consumed in batches of `batch` expressions. Batches are parsed
+    on `executor`, or on a temporary process pool when workers > 1, with at
+    most two batches per worker in flight, and trees travel back as postfix
+    tuples. With a cache, hits are answered locally and new trees are added.
+    """
+    if batch <= 0:
+        raise ValueError("batch must be > 0")
+    if isinstance(exprs, str):
+        raise TypeError("exprs is a str: pass [expr] for one expression or a pathlib.Path for a file")
+    if isinstance(exprs, os.PathLike):
+        items: Iterator[Tuple[int, str]] = _read_lines(exprs)
+    else:
+        items = enumerate(exprs)
+
+    def finish(i: int, text: str, parsed: _Parsed) -> ParseResult:
+        postfix, error, pos = parsed
+        if postfix is None:
+            return ParseResult(i, text, error=error, pos=pos)
+        if serialized:
+            return ParseResult(i, text, postfix=postfix)
+        tree = rpn_to_ast(list(postfix))
+        if cache is not None:
+            cache.put(text, tree)
+        return ParseResult(i, text, tree=tree)
+
+    def local(chunk: List[Tuple[int, str]]) -> List[ParseResult]:
+        out: List[ParseResult] = []
+        for i, text in chunk:
+            try:
+                tree = cache.parse(text) if cache is not None else parse_expression(text)
+            except ParseError as e:
+                out.append(ParseResult(i, text, error=str(e), pos=e.pos))
+                continue
+            if serialized:
+                out.append(ParseResult(i, text, postfix=tuple(to_postfix(tree))))
+            else:
+                out.append(ParseResult(i, text, tree=tree))
+        return out
+
+    if executor is None and (workers is None or workers <= 1):
+        while True:
+            chunk = list(islice(items, batch))
+            if not chunk:
+                return
+            yield from local(chunk)
+
+    pool = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+    width = workers if workers is not None and workers > 1 else (os.cpu_count() or 1)
+    pending: Deque[Tuple[List[Tuple[int, str]], Dict[int, ParseResult], Future]] = deque()
+    try:
+        while True:
+            chunk = list(islice(items, batch))
+            if chunk:
+                done: Dict[int, ParseResult] = {}
+                todo: List[Tuple[int, str]] = []
+                for i, text in chunk:
+                    tree = cache.get(text) if cache is not None else None
+                    if tree is None:
+                        todo.append((i, text))
+                    elif serialized:
+                        done[i] = ParseResult(i, text, postfix=tuple(to_postfix(tree)))
+                    else:
+                        done[i] = ParseResult(i, text, tree=tree)
+                pending.append((chunk, done, pool.submit(_parse_batch, [text for _, text in todo])))
+            if pending and (not chunk or len(pending) >= 2 * width):
+                chunk_done, done, fut = pending.popleft()
+                parsed = iter(fut.result())
+                for i, text in chunk_done:
+                    yield done[i] if i in done else finish(i, text, next(parsed))
+            elif not chunk:
+                return
+    finally:
+        for _, _, fut in pending:
+            fut.cancel()
+        if executor is None:
+            pool.shutdown()
+
+
+def parse_many(
+    exprs: Union[Iterable[str], os.PathLike[str]],
+    serialized: bool = False,
+    cache: Optional[ParseCache] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    batch: int = 1024,
+) -> List[ParseResult]:
+    return list(iter_parse_many(exprs, serialized, cache, workers, executor, batch))
@@ -1,8 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple, Union
+from array import array
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple, Union
 import heapq
+from math import ceil
 from core.ast import Node, is_leaf
+from core.intern import structural_key
 #L5
 
 @dataclass(frozen=True)
@@ -22,60 +25,340 @@ class TaskRun:
     finish: int
 
 
-def _postorder_ops(root: Node) -> List[Node]:
-    out: List[Node] = []
-
-    def dfs(n: Node) -> None:
-        if n.left:
-            dfs(n.left)
-        if n.right:
-            dfs(n.right)
-        if not is_leaf(n):
-            out.append(n)
-
-    dfs(root)
-    return out
-
-
-def build_tasks(root: Node, op_cost: Dict[str, int]) -> Tuple[List[Task], int]:
-    nodes = _postorder_ops(root)
-    node_to_id: Dict[Node, int] = {}
-    for idx, n in enumerate(nodes, start=1):
-        node_to_id[n] = idx
-
-    def dep_id(child: Optional[Node]) -> Optional[int]:
-        if not child or is_leaf(child):
-            return None
-        return node_to_id[child]
-
-    tasks: List[Task] = []
-    for n in nodes:
-        deps: List[int] = []
-        dl = dep_id(n.left)
-        dr = dep_id(n.right)
-        if dl is not None:
-            deps.append(dl)
-        if dr is not None:
-            deps.append(dr)
-        dur = op_cost.get(n.value)
-        if dur is None:
-            raise ValueError(f"Missing op cost for '{n.value}'")
-        tasks.append(Task(node_to_id[n], n.value, int(dur), tuple(sorted(deps))))
-
-    root_task_id = node_to_id[nodes[-1]] if nodes else 0
+class TaskList(List[Task]):
+    """Task list returned by build_tasks.
+
+    Behaves like a plain list and additionally caches per-graph
+    precomputations such as priority ranks. Do not mutate it after
+    scheduling, or the cache goes stale. cse_saved is the number of
+    operations that common subexpression elimination folded into other
+    tasks (0 unless built with cse=True).
+    """
+
+    def __init__(self, tasks: Iterable[Task] = ()) -> None:
+        super().__init__(tasks)
+        self.cache: Dict[Hashable, Any] = {}
+        self.cse_saved = 0
+
+
+class TaskGraph:
+    """Compact array-backed task graph.
+
+    Tasks are stored by index in ascending id order. Per-task data sits in
+    flat int arrays, and successors and predecessors use CSR layout:
+    succ[succ_ptr[i]:succ_ptr[i + 1]] are the dependents of task i. Build a
+    graph once per form and schedule it as often as needed. Derived data
+    such as ranks is cached in `cache`.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        ops: Sequence[int],
+        op_names: Sequence[str],
+        durations: Sequence[int],
+        pred_ptr: Sequence[int],
+        pred: Sequence[int],
+        succ_ptr: Optional[Sequence[int]] = None,
+        succ: Optional[Sequence[int]] = None,
+    ) -> None:
+        self.ids = ids
+        self.ops = ops
+        self.op_names = tuple(op_names)
+        self.durations = durations
+        self.pred_ptr = pred_ptr
+        self.pred = pred
+        if succ_ptr is None or succ is None:
+            succ_ptr, succ = _transpose(len(ids), pred_ptr, pred)
+        self.succ_ptr = succ_ptr
+        self.succ = succ
+        self.cache: Dict[Hashable, Any] = {}
+        self.cse_saved = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def op(self, i: int) -> str:
+        return self.op_names[self.ops[i]]
+
+    def task(self, i: int) -> Task:
+        deps = tuple(self.ids[j] for j in self.pred[self.pred_ptr[i]:self.pred_ptr[i + 1]])
+        return Task(self.ids[i], self.op(i), self.durations[i], deps)
+
+    def to_tasks(self) -> TaskList:
+        tasks = TaskList(self.task(i) for i in range(len(self)))
+        tasks.cse_saved = self.cse_saved
+        return tasks
+
+    def with_costs(self, op_cost: Dict[str, int]) -> "TaskGraph":
+        """Same structure with durations taken from another op_cost table."""
+        per_op = [_op_duration(op_cost, name) for name in self.op_names]
+        g = object.__new__(TaskGraph)
+        g.__dict__.update(self.__dict__)
+        g.durations = array("i", (per_op[o] for o in self.ops))
+        g.cache = {}
+        return g
+
+    @classmethod
+    def from_tasks(cls, tasks: List[Task]) -> "TaskGraph":
+        ordered = sorted(tasks, key=lambda t: t.id)
+        index: Dict[int, int] = {}
+        for i, t in enumerate(ordered):
+            if t.id in index:
+                raise ValueError(f"Duplicate task id {t.id}")
+            index[t.id] = i
+        op_index: Dict[str, int] = {}
+        ops = array("H")
+        pred_ptr = array("i", [0])
+        pred = array("i")
+        for t in ordered:
+            ops.append(op_index.setdefault(t.op, len(op_index)))
+            for d in t.deps:
+                j = index.get(d)
+                if j is None:
+                    raise ValueError(f"Task {t.id} depends on unknown task {d}")
+                pred.append(j)
+            pred_ptr.append(len(pred))
+        return cls(
+            array("i", (t.id for t in ordered)),
+            ops,
+            list(op_index),
+            array("i", (t.duration for t in ordered)),
+            pred_ptr,
+            pred,
+        )
+
+
+def _transpose(n: int, ptr: Sequence[int], adj: Sequence[int]) -> Tuple[array, array]:
+    counts = array("i", bytes(4 * (n + 1)))
+    for j in adj:
+        counts[j + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    out = array("i", bytes(4 * len(adj)))
+    fill = array("i", counts)
+    for i in range(n):
+        for k in range(ptr[i], ptr[i + 1]):
+            j = adj[k]
+            out[fill[j]] = i
+            fill[j] += 1
+    return counts, out
+
+
+def _op_duration(op_cost: Dict[str, int], op: str) -> int:
+    dur = op_cost.get(op)
+    if dur is None:
+        raise ValueError(f"Missing op cost for '{op}'")
+    return int(dur)
+
+
+def as_task_graph(tasks: Union[List[Task], TaskGraph]) -> TaskGraph:
+    """TaskGraph view of tasks, cached on TaskList inputs."""
+    if isinstance(tasks, TaskGraph):
+        return tasks
+    if isinstance(tasks, TaskList):
+        g = tasks.cache.get("graph")
+        if g is None:
+            g = tasks.cache["graph"] = TaskGraph.from_tasks(tasks)
+            g.cse_saved = tasks.cse_saved
+        return g
+    return TaskGraph.from_tasks(tasks)
+
+
+# Priority callback: (task, time it became ready) -> sort key, lowest key is
+# dispatched first. Ties are broken by task id.
+PriorityFn = Callable[[Task, int], Any]
+PRIORITIES = ("id", "blevel", "hlfet", "etf")
+
+
+def _postorder_ops(root: Node, cse: bool = False) -> Tuple[List[Tuple[Node, Optional[int], Optional[int]]], int]:
+    """Operations of root in postorder as (node, left id, right id), ids
+    1-based and None for leaves, plus the number of operations saved by CSE.
+
+    Without cse every occurrence gets its own id. With cse a subtree that
+    is structurally equal to one already emitted reuses its id and is not
+    walked again, so the ops form a DAG with one entry per distinct
+    subexpression.
+    """
+    out: List[Tuple[Node, Optional[int], Optional[int]]] = []
+    ids: List[Optional[int]] = []
+    seen: Dict[int, int] = {}
+    size = [0]  # operations in the subtree of each id
+    saved = 0
+    if cse:
+        structural_key(root)
+    stack: List[Tuple[Node, bool]] = [(root, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if is_leaf(n):
+            ids.append(None)
+            continue
+        if not expanded:
+            hit = seen.get(n.key) if cse else None
+            if hit is not None:
+                ids.append(hit)
+                saved += size[hit]
+                continue
+            stack.append((n, True))
+            if n.right:
+                stack.append((n.right, False))
+            if n.left:
+                stack.append((n.left, False))
+            continue
+        dr = ids.pop() if n.right else None
+        dl = ids.pop() if n.left else None
+        out.append((n, dl, dr))
+        ids.append(len(out))
+        if cse:
+            seen[n.key] = len(out)
+            size.append(1 + (size[dl] if dl else 0) + (size[dr] if dr else 0))
+    return out, saved
+
+
+def _dep_ids(dl: Optional[int], dr: Optional[int]) -> List[int]:
+    # Under CSE both operands can be the same task, e.g. (a+b)*(a+b).
+    return sorted({d for d in (dl, dr) if d is not None})
+
+
+def build_tasks(root: Node, op_cost: Dict[str, int], cse: bool = False) -> Tuple[List[Task], int]:
+    # Ids are assigned per occurrence, so interned trees with shared
+    # subtrees still produce one task per operation in the expression,
+    # unless cse asks for one task per distinct subexpression.
+    nodes, saved = _postorder_ops(root, cse)
+
+    tasks = TaskList()
+    for idx, (n, dl, dr) in enumerate(nodes, start=1):
+        tasks.append(Task(idx, n.value, _op_duration(op_cost, n.value), tuple(_dep_ids(dl, dr))))
+    tasks.cse_saved = saved
+
+    root_task_id = len(nodes)
     return tasks, root_task_id
 
 
-def sequential_time(tasks: List[Task]) -> int:
+def build_task_graph(root: Node, op_cost: Dict[str, int], cse: bool = False) -> TaskGraph:
+    """TaskGraph of root with the same ids as build_tasks, without Task objects."""
+    nodes, saved = _postorder_ops(root, cse)
+    op_index: Dict[str, int] = {}
+    ops = array("H")
+    durations = array("i")
+    pred_ptr = array("i", [0])
+    pred = array("i")
+    for n, dl, dr in nodes:
+        code = op_index.get(n.value)
+        if code is None:
+            _op_duration(op_cost, n.value)
+            code = op_index[n.value] = len(op_index)
+        ops.append(code)
+        durations.append(int(op_cost[n.value]))
+        for d in _dep_ids(dl, dr):
+            pred.append(d - 1)
+        pred_ptr.append(len(pred))
+    g = TaskGraph(array("i", range(1, len(nodes) + 1)), ops, list(op_index), durations, pred_ptr, pred)
+    g.cse_saved = saved
+    return g
+
+
+def sequential_time(tasks: Union[List[Task], TaskGraph]) -> int:
+    if isinstance(tasks, TaskGraph):
+        return sum(tasks.durations)
     return sum(t.duration for t in tasks)
 
 
+def _levels(g: TaskGraph, mem_cost: int) -> List[int]:
+    key = ("levels", mem_cost)
+    hit = g.cache.get(key)
+    if hit is not None:
+        return hit
+    n = len(g)
+    outdeg = [g.succ_ptr[i + 1] - g.succ_ptr[i] for i in range(n)]
+    level = [0] * n
+    stack = [i for i in range(n) if outdeg[i] == 0]
+    done = 0
+    while stack:
+        i = stack.pop()
+        best = 0
+        for k in range(g.succ_ptr[i], g.succ_ptr[i + 1]):
+            best = max(best, level[g.succ[k]])
+        level[i] = g.durations[i] + mem_cost + best
+        done += 1
+        for k in range(g.pred_ptr[i], g.pred_ptr[i + 1]):
+            d = g.pred[k]
+            outdeg[d] -= 1
+            if outdeg[d] == 0:
+                stack.append(d)
+    if done != n:
+        raise ValueError("Task graph has a dependency cycle")
+    g.cache[key] = level
+    return level
+
+
+def upward_ranks(tasks: Union[List[Task], TaskGraph], mem_cost: int = 0) -> Dict[int, int]:
+    """Bottom level of every task: the longest path from the task to an exit,
+    counting each task's duration plus mem_cost."""
+    g = as_task_graph(tasks)
+    return dict(zip(g.ids, _levels(g, mem_cost)))
+
+
+def makespan_lower_bound(
+    tasks: Union[List[Task], TaskGraph],
+    processors: int,
+    memory_banks: int,
+    mem_cost: int,
+) -> int:
+    """Cheap lower bound on the makespan of any schedule_dataflow run.
+
+    Maximum of the critical path (with memory access), the total processor
+    work over P, and the memory-bank bound ceil(n / banks) * mem_cost
+    followed by the shortest task.
+    """
+    g = as_task_graph(tasks)
+    n = len(g)
+    if not n:
+        return 0
+    critical = max(_levels(g, mem_cost))
+    work = ceil((sum(g.durations) + n * mem_cost) / processors)
+    memory = ceil(n / memory_banks) * mem_cost + min(g.durations) if mem_cost else 0
+    return max(critical, work, memory)
+
+
+# Index-based key: (task index, time it became ready) -> sort key.
+_IndexKey = Callable[[int, int], Any]
+
+
+def _priority_key(g: TaskGraph, priority: Union[str, PriorityFn, None], mem_cost: int) -> Optional[_IndexKey]:
+    if priority is None or priority == "id":
+        return None
+    if callable(priority):
+        fn = priority
+        return lambda i, ready_at: fn(g.task(i), ready_at)
+    if priority == "blevel":
+        blevel = _levels(g, mem_cost)
+        return lambda i, _ready: -blevel[i]
+    if priority == "hlfet":
+        level = _levels(g, 0)
+        return lambda i, _ready: -level[i]
+    if priority == "etf":
+        level = _levels(g, 0)
+        return lambda i, ready_at: (ready_at, -level[i])
+    raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES} or a callable")
+
+
 def schedule_dataflow(
-    tasks: List[Task],
+    tasks: Union[List[Task], TaskGraph],
     processors: int,
     memory_banks: int,
     mem_cost: int,
+    priority: Union[str, PriorityFn, None] = None,
 ) -> Tuple[int, List[TaskRun]]:
+    """List-schedule tasks on a dataflow machine.
+
+    tasks may be a List[Task] or a prebuilt TaskGraph; lists are converted
+    (and the conversion cached on a TaskList). priority picks among ready
+    tasks: "id" (default, ascending task id), "blevel" (longest path to exit
+    incl. memory access, i.e. critical path first), "hlfet" (static level
+    from durations only), "etf" (earliest ready first, ties by static level)
+    or a PriorityFn.
+    """
     if processors <= 0:
         raise ValueError("processors must be > 0")
     if memory_banks <= 0:
@@ -83,79 +366,175 @@ def schedule_dataflow(
     if mem_cost < 0:
         raise ValueError("mem_cost must be >= 0")
 
-    tasks_by_id: Dict[int, Task] = {t.id: t for t in tasks}
-    dependents: Dict[int, List[int]] = {t.id: [] for t in tasks}
-    indeg: Dict[int, int] = {t.id: len(t.deps) for t in tasks}
-
-    for t in tasks:
-        for d in t.deps:
-            dependents[d].append(t.id)
-
-    ready: List[int] = [t.id for t in tasks if indeg[t.id] == 0]
-    ready.sort()
-
-    proc_free: List[Tuple[int, int]] = [(0, p) for p in range(processors)]
-    heapq.heapify(proc_free)
-
-    bank_free: List[int] = [0 for _ in range(memory_banks)]
-
+    g = as_task_graph(tasks)
+    return _list_schedule(g, processors, memory_banks, mem_cost, _priority_key(g, priority, mem_cost))
+
+
+class ScheduleLog:
+    """Event order of one list-scheduling run, enough to restart it at any
+    dispatch (see core.incremental).
+
+    runs[k] is the k-th dispatch, of task index order[k] on memory bank
+    banks[k] (-1 without memory cost), made after done_before[k] completions;
+    completions lists task indices in the order they finished.
+    """
+
+    __slots__ = ("order", "banks", "done_before", "completions", "runs")
+
+    def __init__(self) -> None:
+        self.order: List[int] = []
+        self.banks: List[int] = []
+        self.done_before: List[int] = []
+        self.completions: List[int] = []
+        self.runs: List[TaskRun] = []
+
+
+# Scheduler state: ready, proc_free, bank_free, running, finish_time, indeg,
+# time, completions so far.
+_State = Tuple[
+    List[Tuple[Any, int]],
+    List[Tuple[int, int]],
+    List[Tuple[int, int]],
+    List[Tuple[int, int, int]],
+    List[int],
+    List[int],
+    int,
+    int,
+]
+
+
+def _resume_state(g: TaskGraph, log: ScheduleLog, d: int, processors: int, memory_banks: int) -> _State:
+    """State just before dispatch d of a logged "id"-priority run, for a
+    graph g whose tasks dispatched before d are the same tasks, at the same
+    indices, as in the logged graph."""
+    n = len(g)
+    done = log.done_before[d] if d < len(log.order) else len(log.completions)
+    finished = bytearray(n)
+    for i in log.completions[:done]:
+        finished[i] = 1
+    dispatched = bytearray(n)
+    finish_time = [0] * n
+    proc_last = [0] * processors
+    bank_last = [0] * memory_banks
+    busy = set()
     running: List[Tuple[int, int, int]] = []
+    for k in range(d):
+        i = log.order[k]
+        r = log.runs[k]
+        dispatched[i] = 1
+        if log.banks[k] >= 0:
+            bank_last[log.banks[k]] = max(bank_last[log.banks[k]], r.start)
+        if finished[i]:
+            finish_time[i] = r.finish
+            proc_last[r.proc] = max(proc_last[r.proc], r.finish)
+        else:
+            running.append((r.finish, i, r.proc))
+            busy.add(r.proc)
     heapq.heapify(running)
+    time = finish_time[log.completions[done - 1]] if done else 0
+
+    pred_ptr, pred = g.pred_ptr, g.pred
+    indeg = [0] * n
+    ready: List[Tuple[Any, int]] = []
+    for i in range(n):
+        if dispatched[i]:
+            continue
+        c = 0
+        for k in range(pred_ptr[i], pred_ptr[i + 1]):
+            if not finished[pred[k]]:
+                c += 1
+        indeg[i] = c
+        if not c:
+            ready.append((i, i))
+    heapq.heapify(ready)
+    proc_free = [(proc_last[p], p) for p in range(processors) if p not in busy]
+    heapq.heapify(proc_free)
+    bank_free = [(bank_last[b], b) for b in range(memory_banks)]
+    heapq.heapify(bank_free)
+    return ready, proc_free, bank_free, running, finish_time, indeg, time, done
 
-    finish_time: Dict[int, int] = {}
-    runs: List[TaskRun] = []
-    time = 0
-
-    def reserve_memory(start: int) -> int:
-        if mem_cost == 0:
-            return start
-        best_i = 0
-        best_t = bank_free[0]
-        for i in range(1, memory_banks):
-            if bank_free[i] < best_t:
-                best_t = bank_free[i]
-                best_i = i
-        s = max(start, bank_free[best_i])
-        bank_free[best_i] = s + mem_cost
-        return s + mem_cost
-
-    while len(finish_time) < len(tasks):
-        started = False
 
+def _list_schedule(
+    g: TaskGraph,
+    processors: int,
+    memory_banks: int,
+    mem_cost: int,
+    key: Optional[_IndexKey],
+    log: Optional[ScheduleLog] = None,
+    state: Optional[_State] = None,
+) -> Tuple[int, List[TaskRun]]:
+    n = len(g)
+    # Plain-list copies of the arrays: one C-level copy per call is cheaper
+    # than boxing an int on every array access in the loop below.
+    ids, durations = list(g.ids), list(g.durations)
+    names = [g.op_names[o] for o in g.ops]
+    pred_ptr, pred = list(g.pred_ptr), list(g.pred)
+    succ_ptr, succ = list(g.succ_ptr), list(g.succ)
+
+    # Event-driven: every structure is a heap, so each task costs O(log V)
+    # on dispatch and on completion. Ties break on the smallest task id,
+    # processor index and bank index, as in a linear scan.
+    if state is None:
+        indeg = [pred_ptr[i + 1] - pred_ptr[i] for i in range(n)]
+        ready: List[Tuple[Any, int]] = [(key(i, 0) if key else i, i) for i in range(n) if indeg[i] == 0]
+        heapq.heapify(ready)
+
+        proc_free: List[Tuple[int, int]] = [(0, p) for p in range(processors)]
+        bank_free: List[Tuple[int, int]] = [(0, b) for b in range(memory_banks)]
+        running: List[Tuple[int, int, int]] = []
+
+        finish_time = [0] * n
+        time = 0
+        done = 0
+    else:
+        ready, proc_free, bank_free, running, finish_time, indeg, time, done = state
+    if log is None:
+        log = ScheduleLog()
+        record = False
+    else:
+        record = True
+    runs = log.runs
+
+    while done < n:
         while ready and proc_free:
-            t_id = ready[0]
-            t = tasks_by_id[t_id]
+            _, i = heapq.heappop(ready)
             p_time, p = heapq.heappop(proc_free)
 
             deps_done = 0
-            for d in t.deps:
-                deps_done = max(deps_done, finish_time.get(d, 0))
+            for k in range(pred_ptr[i], pred_ptr[i + 1]):
+                deps_done = max(deps_done, finish_time[pred[k]])
 
             start = max(time, p_time, deps_done)
-            start = reserve_memory(start)
-            finish = start + t.duration
-
-            runs.append(TaskRun(t_id, t.op, p, start, finish))
-            heapq.heappush(running, (finish, t_id, p))
-            ready.pop(0)
-            started = True
-
-        if running:
-            finish, t_id, p = heapq.heappop(running)
-            time = max(time, finish)
-            finish_time[t_id] = finish
-            heapq.heappush(proc_free, (time, p))
-
-            for nxt in dependents[t_id]:
-                indeg[nxt] -= 1
-                if indeg[nxt] == 0:
-                    ready.append(nxt)
-            ready.sort()
-        else:
-            if not started and proc_free:
-                time = max(time, proc_free[0][0])
-            else:
-                time += 1
+            bank = -1
+            if mem_cost:
+                b_time, bank = heapq.heappop(bank_free)
+                start = max(start, b_time) + mem_cost
+                heapq.heappush(bank_free, (start, bank))
+            finish = start + durations[i]
+
+            runs.append(TaskRun(ids[i], names[i], p, start, finish))
+            heapq.heappush(running, (finish, i, p))
+            if record:
+                log.order.append(i)
+                log.banks.append(bank)
+                log.done_before.append(done)
+
+        if not running:
+            raise ValueError("Task graph has a dependency cycle")
+
+        finish, i, p = heapq.heappop(running)
+        time = max(time, finish)
+        finish_time[i] = finish
+        done += 1
+        heapq.heappush(proc_free, (time, p))
+        if record:
+            log.completions.append(i)
+
+        for k in range(succ_ptr[i], succ_ptr[i + 1]):
+            nxt = succ[k]
+            indeg[nxt] -= 1
+            if indeg[nxt] == 0:
+                heapq.heappush(ready, (key(nxt, time) if key else nxt, nxt))
 
     makespan = max(r.finish for r in runs) if runs else 0
     return makespan, sorted(runs, key=lambda x: (x.start, x.proc, x.task_id))
@@ -0,0 +1,244 @@
+from __future__ import annotations
+from array import array
+import mmap
+from pathlib import Path
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+from core.ast import Node, is_leaf
+from core.schedule import Task, TaskGraph, as_task_graph
+#L6
+# Versioned little-endian binary formats for forms and task graphs.
+#
+# Every blob starts with a 24-byte header: magic, version (u16), flags (u16)
+# and three u32 counts, followed by a u32 of padding. All sections start on
+# 8-byte boundaries, so int arrays can be read in place with memoryview.cast
+# from bytes, a memoryview or an mmap without copying them.
+#
+# Forms ("KTKF", counts: forms, codes, symbols)
+#   symbol table, form_ptr i32[forms + 1], codes u16 or i32[codes]
+#   codes[form_ptr[k]:form_ptr[k + 1]] is form k in postorder. A code is
+#   symbol << 1 for a leaf and symbol << 1 | 1 for a binary operator. Codes
+#   are u16 (flag WIDE clear) unless the symbol table is too large.
+#
+# Task graphs ("KTKG", counts: tasks, edges, op names)
+#   symbol table, ids i32[tasks], ops u16[tasks], durations i32[tasks],
+#   pred_ptr i32[tasks + 1], pred i32[edges], succ_ptr i32[tasks + 1],
+#   succ i32[edges]
+#
+# Symbol table: offsets u32[symbols + 1] into the UTF-8 blob that follows.
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+VERSION = 1
+FORMS_MAGIC = b"KTKF"
+GRAPH_MAGIC = b"KTKG"
+
+WIDE = 1
+
+_HEADER = struct.Struct("<4sHHIII4x")
+_LITTLE = sys.byteorder == "little"
+
+
+def _padding(n: int) -> bytes:
+    return bytes(-n % 8)
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> None:
+        self.parts.append(data)
+        self.size += len(data)
+        pad = _padding(self.size)
+        if pad:
+            self.parts.append(pad)
+            self.size += len(pad)
+
+    def ints(self, code: str, values: Iterable[int]) -> None:
+        a = values if isinstance(values, array) and values.typecode == code else array(code, values)
+        if not _LITTLE:
+            a = array(code, a)
+            a.byteswap()
+        self.add(a.tobytes())
+
+    def symbols(self, names: Sequence[str]) -> None:
+        blob = [s.encode("utf-8") for s in names]
+        offsets = [0]
+        for b in blob:
+            offsets.append(offsets[-1] + len(b))
+        self.ints("I", offsets)
+        self.add(b"".join(blob))
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+
+class _Reader:
+    def __init__(self, buf: Buffer, magic: bytes) -> None:
+        self.mv = memoryview(buf).cast("B")
+        if len(self.mv) < _HEADER.size:
+            raise ValueError("Truncated buffer")
+        got, version, self.flags, a, b, c = _HEADER.unpack_from(self.mv, 0)
+        if got != magic:
+            raise ValueError(f"Bad magic {bytes(got)!r}, expected {magic!r}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported format version {version}")
+        self.counts = (a, b, c)
+        self.off = _HEADER.size
+
+    def _take(self, size: int) -> memoryview:
+        raw = self.mv[self.off:self.off + size]
+        if len(raw) != size:
+            raise ValueError("Truncated buffer")
+        self.off += size + (-size % 8)
+        return raw
+
+    def ints(self, code: str, count: int) -> Sequence[int]:
+        raw = self._take(count * array(code).itemsize)
+        if _LITTLE:
+            return raw.cast(code)
+        a = array(code)
+        a.frombytes(raw)
+        a.byteswap()
+        return a
+
+    def symbols(self, count: int) -> Tuple[str, ...]:
+        offsets = self.ints("I", count + 1)
+        blob = self._take(offsets[-1])
+        return tuple(str(blob[offsets[k]:offsets[k + 1]], "utf-8") for k in range(count))
+
+
+def _encode(n: Node, symbols: Dict[str, int], codes: array) -> None:
+    stack: List[Tuple[Node, bool]] = [(n, False)]
+    while stack:
+        x, expanded = stack.pop()
+        leaf = is_leaf(x)
+        if expanded or leaf:
+            codes.append(symbols.setdefault(x.value, len(symbols)) << 1 | (not leaf))
+            continue
+        if not x.left or not x.right:
+            raise ValueError("Invalid AST")
+        stack.append((x, True))
+        stack.append((x.right, False))
+        stack.append((x.left, False))
+
+
+def pack_forms(forms: Iterable[Node]) -> bytes:
+    """Encode forms into one blob; see unpack_forms."""
+    symbols: Dict[str, int] = {}
+    codes = array("i")
+    form_ptr = array("i", [0])
+    for n in forms:
+        _encode(n, symbols, codes)
+        form_ptr.append(len(codes))
+    flags = WIDE if 2 * len(symbols) > 0xFFFF else 0
+    w = _Writer()
+    w.add(_HEADER.pack(FORMS_MAGIC, VERSION, flags, len(form_ptr) - 1, len(codes), len(symbols)))
+    w.symbols(list(symbols))
+    w.ints("i", form_ptr)
+    w.ints("i" if flags & WIDE else "H", codes)
+    return w.getvalue()
+
+
+class FormLibrary:
+    """Read-only sequence of forms backed by a pack_forms blob.
+
+    The code arrays are read in place, so a library mapped with map_file
+    only pages in the forms that are actually decoded.
+    """
+
+    def __init__(self, buf: Buffer) -> None:
+        r = _Reader(buf, FORMS_MAGIC)
+        n_forms, n_codes, n_symbols = r.counts
+        self.symbols = r.symbols(n_symbols)
+        self.form_ptr = r.ints("i", n_forms + 1)
+        self.codes = r.ints("i" if r.flags & WIDE else "H", n_codes)
+
+    def __len__(self) -> int:
+        return len(self.form_ptr) - 1
+
+    def __getitem__(self, k: int) -> Node:
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("form index out of range")
+        symbols = self.symbols
+        st: List[Node] = []
+        for c in self.codes[self.form_ptr[k]:self.form_ptr[k + 1]]:
+            if c & 1:
+                if len(st) < 2:
+                    raise ValueError("Corrupt form")
+                b = st.pop()
+                st[-1] = Node(symbols[c >> 1], st[-1], b)
+            else:
+                st.append(Node(symbols[c >> 1]))
+        if len(st) != 1:
+            raise ValueError("Corrupt form")
+        return st[0]
+
+    def __iter__(self) -> Iterator[Node]:
+        for k in range(len(self)):
+            yield self[k]
+
+    def postfix(self, k: int) -> List[str]:
+        """Postorder tokens of form k, as core.equivalence.to_postfix."""
+        symbols = self.symbols
+        return [symbols[c >> 1] for c in self.codes[self.form_ptr[k]:self.form_ptr[k + 1]]]
+
+
+def unpack_forms(buf: Buffer) -> FormLibrary:
+    return FormLibrary(buf)
+
+
+def pack_node(n: Node) -> bytes:
+    return pack_forms((n,))
+
+
+def unpack_node(buf: Buffer) -> Node:
+    lib = FormLibrary(buf)
+    if len(lib) != 1:
+        raise ValueError(f"Expected one form, found {len(lib)}")
+    return lib[0]
+
+
+def pack_graph(tasks: Union[List[Task], TaskGraph]) -> bytes:
+    """Encode a task list or TaskGraph, including its successor CSR."""
+    g = as_task_graph(tasks)
+    n = len(g)
+    w = _Writer()
+    w.add(_HEADER.pack(GRAPH_MAGIC, VERSION, 0, n, len(g.pred), len(g.op_names)))
+    w.symbols(g.op_names)
+    w.ints("i", g.ids)
+    w.ints("H", g.ops)
+    w.ints("i", g.durations)
+    w.ints("i", g.pred_ptr)
+    w.ints("i", g.pred)
+    w.ints("i", g.succ_ptr)
+    w.ints("i", g.succ)
+    return w.getvalue()
+
+
+def unpack_graph(buf: Buffer) -> TaskGraph:
+    """TaskGraph whose arrays are views into buf; nothing is recomputed."""
+    r = _Reader(buf, GRAPH_MAGIC)
+    n, m, n_ops = r.counts
+    op_names = r.symbols(n_ops)
+    ids = r.ints("i", n)
+    ops = r.ints("H", n)
+    durations = r.ints("i", n)
+    pred_ptr = r.ints("i", n + 1)
+    pred = r.ints("i", m)
+    succ_ptr = r.ints("i", n + 1)
+    succ = r.ints("i", m)
+    return TaskGraph(ids, ops, op_names, durations, pred_ptr, pred, succ_ptr=succ_ptr, succ=succ)
+
+
+def map_file(path: Union[str, Path]) -> memoryview:
+    """Read-only memory map of a packed file, for unpack_forms/unpack_graph."""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
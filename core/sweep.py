@@ -0,0 +1,105 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from core.ast import Node
+from core.schedule import PriorityFn, Task, TaskGraph, as_task_graph, build_task_graph, schedule_dataflow, sequential_time
+#L5
+OpCost = Tuple[Tuple[str, int], ...]
+
+
+@dataclass(frozen=True)
+class SweepRow:
+    processors: int
+    memory_banks: int
+    mem_cost: int
+    op_cost: OpCost
+    t1: int
+    tp: int
+    s: float
+    e: float
+
+
+def _makespan(job: Tuple[TaskGraph, int, int, int, Union[str, PriorityFn, None]]) -> int:
+    g, p, banks, mem_cost, priority = job
+    tp, _runs = schedule_dataflow(g, processors=p, memory_banks=banks, mem_cost=mem_cost, priority=priority)
+    return tp
+
+
+def sweep_configs(
+    form: Union[Node, List[Task], TaskGraph],
+    processors: Iterable[int],
+    memory_banks: Iterable[int],
+    mem_costs: Iterable[int],
+    op_costs: Optional[Iterable[Dict[str, int]]] = None,
+    priority: Union[str, PriorityFn, None] = None,
+    workers: Optional[int] = None,
+    cse: bool = False,
+) -> List[SweepRow]:
+    """T1, Tp, S and E of one form for every point of a machine-config grid.
+
+    The task graph is built once and re-costed per op_cost table; ranks are
+    cached per costed graph. Configs that cannot differ are simulated once:
+    with at least as many processors as tasks there is never processor
+    contention, so P is capped at the task count, and without memory cost
+    the bank count is irrelevant. With workers > 1 the
+    remaining simulations run in a process pool. Rows follow the grid order
+    op_cost, processors, memory_banks, mem_cost. Without op_costs a task
+    list or graph is swept with its own durations. cse is passed on to
+    build_task_graph when sweeping an AST.
+    """
+    grid = list(product(processors, memory_banks, mem_costs))
+    if isinstance(form, Node):
+        if op_costs is None:
+            raise ValueError("op_costs is required when sweeping an AST")
+        op_costs = list(op_costs)
+        if not op_costs:
+            return []
+        base = build_task_graph(form, op_costs[0], cse=cse)
+    else:
+        base = as_task_graph(form)
+
+    if op_costs is None:
+        graphs = [base]
+        oc_keys: List[OpCost] = [()]
+    else:
+        op_costs = list(op_costs)
+        graphs = [base.with_costs(oc) for oc in op_costs]
+        oc_keys = [tuple(sorted(oc.items())) for oc in op_costs]
+    n = len(base)
+
+    def effective(gi: int, p: int, banks: int, mem_cost: int) -> Tuple[int, int, int, int]:
+        return (gi, min(p, max(n, 1)), banks if mem_cost else min(banks, 1), mem_cost)
+
+    jobs: Dict[Tuple[int, int, int, int], Tuple[TaskGraph, int, int, int, Union[str, PriorityFn, None]]] = {}
+    for gi, g in enumerate(graphs):
+        for p, banks, mem_cost in grid:
+            k = effective(gi, p, banks, mem_cost)
+            jobs.setdefault(k, (g,) + k[1:] + (priority,))
+
+    keys = list(jobs)
+    if workers is not None and workers > 1 and len(keys) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tps = list(pool.map(_makespan, [jobs[k] for k in keys], chunksize=max(1, len(keys) // (4 * workers))))
+    else:
+        tps = [_makespan(jobs[k]) for k in keys]
+    tp_of = dict(zip(keys, tps))
+
+    rows: List[SweepRow] = []
+    for gi, (g, oc_key) in enumerate(zip(graphs, oc_keys)):
+        t1 = sequential_time(g)
+        for p, banks, mem_cost in grid:
+            tp = tp_of[effective(gi, p, banks, mem_cost)]
+            s = (t1 / tp) if tp > 0 else 0.0
+            e = (s / p) if p > 0 else 0.0
+            rows.append(SweepRow(p, banks, mem_cost, oc_key, t1, tp, s, e))
+    return rows
+
+
+def print_sweep(rows: List[SweepRow]) -> None:
+    print("P | banks | mem | op_cost | T1 | Tp | S | E")
+    print("--:|-----:|---:|:--------|---:|---:|---:|---:")
+    for r in rows:
+        oc = ",".join(f"{k}{v}" for k, v in r.op_cost)
+        print(f"{r.processors:>2} | {r.memory_banks:>5} | {r.mem_cost:>3} | {oc} | {r.t1:>3} | {r.tp:>3} | {r.s:>6.3f} | {r.e:>6.3f}")
@@ -1,34 +1,111 @@
 from __future__ import annotations
-from typing import List
+import codecs
+from typing import BinaryIO, Iterator, List, Optional, TextIO, Tuple, Union
 #L2
-def tokenize(expr: str) -> List[str]:
-    s = expr.replace(" ", "")
-    tokens: List[str] = []
-    i = 0
-    while i < len(s):
-        ch = s[i]
-        if ch in "+-*/()":
-            tokens.append(ch)
-            i += 1
-            continue
-        if ch.isalpha() or ch == "_":
-            j = i + 1
-            while j < len(s) and (s[j].isalnum() or s[j] == "_"):
-                j += 1
-            tokens.append(s[i:j])
+Source = Union[str, bytes, bytearray, memoryview, TextIO, BinaryIO]
+Token = Tuple[str, int]
+
+CHUNK_SIZE = 1 << 16
+
+
+class ParseError(ValueError):
+    """Tokenizer or parser error at character offset pos of the input."""
+
+    def __init__(self, message: str, pos: int) -> None:
+        super().__init__(f"{message} at position {pos}")
+        self.pos = pos
+
+
+def _chunks(source: Source, chunk_size: int) -> Iterator[str]:
+    if isinstance(source, str):
+        yield source
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        mv = memoryview(source).cast("B")
+        for off in range(0, len(mv), chunk_size):
+            yield decoder.decode(mv[off:off + chunk_size])
+        yield decoder.decode(b"", final=True)
+        return
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            break
+        yield data if isinstance(data, str) else decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+def iter_tokens(source: Source, chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+    """Yield (token, position) pairs from a str, bytes-like or file object.
+
+    The input is read chunk by chunk and never copied as a whole.
+    Whitespace (spaces, tabs, newlines) is ignored everywhere, also inside
+    names and numbers, as tokenize has always done for spaces. Positions are character offsets into the original input.
+    """
+    pos = 0
+    kind: Optional[str] = None  # "name" or "number" while a token is open
+    pieces: List[str] = []
+    start = 0
+
+    for chunk in _chunks(source, chunk_size):
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if kind is None:
+                ch = chunk[i]
+                if ch.isspace():
+                    i += 1
+                    continue
+                if ch in "+-*/()":
+                    yield ch, pos + i
+                    i += 1
+                    continue
+                if ch.isalpha() or ch == "_":
+                    kind = "name"
+                elif ch.isdigit() or ch == ".":
+                    kind = "number"
+                else:
+                    raise ParseError(f"Unexpected char: {ch}", pos + i)
+                start = pos + i
+                j = i + 1
+            else:
+                j = i
+            # A token runs on through whitespace; it may also run past the chunk.
+            if kind == "name":
+                while j < n:
+                    c = chunk[j]
+                    if not (c.isalnum() or c == "_" or c.isspace()):
+                        break
+                    j += 1
+            else:
+                while j < n:
+                    c = chunk[j]
+                    if not (c.isdigit() or c == "." or c.isspace()):
+                        break
+                    j += 1
+            if j == n:
+                pieces.append(chunk[i:j])
+                break
+            text = chunk[i:j]
+            if pieces:
+                pieces.append(text)
+                text = "".join(pieces)
+                pieces = []
+            yield _close(kind, text, start)
+            kind = None
             i = j
-            continue
-        if ch.isdigit() or ch == ".":
-            j = i + 1
-            dot = 1 if ch == "." else 0
-            while j < len(s) and (s[j].isdigit() or s[j] == "."):
-                if s[j] == ".":
-                    dot += 1
-                j += 1
-            if dot > 1:
-                raise ValueError(f"Invalid number token near: {s[i:j]}")
-            tokens.append(s[i:j])
-            i = j
-            continue
-        raise ValueError(f"Unexpected char: {ch}")
-    return tokens
+        pos += n
+    if kind is not None:
+        yield _close(kind, "".join(pieces), start)
+
+
+def _close(kind: str, text: str, start: int) -> Token:
+    if not (text.isalnum() or text.isidentifier()):  # may hold whitespace
+        text = "".join(text.split())
+    if kind == "number" and text.count(".") > 1:
+        raise ParseError(f"Invalid number token near: {text}", start)
+    return text, start
+
+
+def tokenize(expr: Source) -> List[str]:
+    return [tok for tok, _pos in iter_tokens(expr)]
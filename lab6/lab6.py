@@ -1,11 +1,35 @@
 from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Set, Tuple
-from core.ast import Node, is_leaf
+from functools import partial
+from itertools import chain, islice
+import heapq
+import os
+import random
+from threading import Event
+from time import monotonic
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from core.ast import Node
 from core.parse import parse_expression
 from core.parallel_form import build_parallel_form
-from core.equivalence import assoc_generate, dist_generate, to_infix
-from core.schedule import build_tasks, schedule_dataflow, sequential_time
+from core.equivalence import (
+    collect_chain_assoc,
+    dist_rewrites_at_node,
+    iter_assoc_forms,
+    iter_assoc_trees,
+    iter_dist_forms,
+    iter_nodes,
+    replace_subtree,
+    to_infix,
+)
+from core.eval_cache import EvalCache, config_key
+from core.exact import schedule_exact
+from core.incremental import FormEval, evaluate, evaluate_rewrite, rewrite_form
+from core.intern import key_scope, structural_key
+from core.metaheuristic import METHODS, SearchTrace
+from core.serialize import pack_forms, pack_node, unpack_forms, unpack_node
+from core.schedule import build_task_graph, makespan_lower_bound, schedule_dataflow, sequential_time
 
 
 @dataclass(frozen=True)
@@ -19,104 +43,64 @@ class EvalRow:
     ops: int
 
 
-def clone(n: Node) -> Node:
-    if is_leaf(n):
-        return Node(n.value)
-    return Node(n.value, clone(n.left) if n.left else None, clone(n.right) if n.right else None)
+@dataclass
+class PruneStats:
+    evaluated: int = 0
+    pruned: int = 0
 
+    def __str__(self) -> str:
+        total = self.evaluated + self.pruned
+        share = (self.pruned / total) if total else 0.0
+        return f"evaluated={self.evaluated}, pruned={self.pruned} ({share:.1%})"
 
-def iter_nodes(root: Node) -> List[Node]:
-    acc: List[Node] = []
 
-    def dfs(x: Node) -> None:
-        acc.append(x)
-        if x.left:
-            dfs(x.left)
-        if x.right:
-            dfs(x.right)
+@dataclass
+class BeamStats:
+    expanded: int = 0
+    evaluated: int = 0
+    duplicates: int = 0
 
-    dfs(root)
-    return acc
+    def __str__(self) -> str:
+        return f"expanded={self.expanded}, evaluated={self.evaluated}, duplicates={self.duplicates}"
 
 
-def replace_subtree(root: Node, target: Node, replacement: Node) -> Node:
-    if root is target:
-        return replacement
-    if is_leaf(root):
-        return Node(root.value)
-    left = replace_subtree(root.left, target, replacement) if root.left else None
-    right = replace_subtree(root.right, target, replacement) if root.right else None
-    return Node(root.value, left, right)
-
+@dataclass(frozen=True)
+class Progress:
+    phase: str  # "generate", then "search"
+    evaluations: int
+    elapsed: float
+    rate: float  # evaluations per second
+    best: EvalRow
+    frontier: int  # beam size in the search phase, 0 while generating
 
-def collect_chain_assoc(n: Node, op: str) -> List[Node]:
-    items: List[Node] = []
+    @property
+    def best_tp(self) -> int:
+        return self.best.tp
 
-    def dfs(x: Node) -> None:
-        if x.value == op and x.left and x.right:
-            dfs(x.left)
-            dfs(x.right)
-        else:
-            items.append(x)
 
-    dfs(n)
-    return items
+@dataclass(frozen=True)
+class AnytimeResult:
+    best: EvalRow
+    evaluations: int
+    elapsed: float
+    stopped: str  # "time", "evals", "cancelled" or "exhausted"
 
 
 def all_assoc_trees(op: str, operands: List[Node], limit: int) -> List[Node]:
-    if len(operands) == 1:
-        return [clone(operands[0])]
-    res: List[Node] = []
-    for i in range(1, len(operands)):
-        left_ops = operands[:i]
-        right_ops = operands[i:]
-        left_trees = all_assoc_trees(op, left_ops, limit)
-        right_trees = all_assoc_trees(op, right_ops, limit)
-        for lt in left_trees:
-            for rt in right_trees:
-                res.append(Node(op, lt, rt))
-                if len(res) >= limit:
-                    return res
-    return res
-
-
-def dist_rewrites_at_node(node: Node) -> List[Node]:
-    if not node.left or not node.right:
-        return []
-    res: List[Node] = []
-    if node.value == "*":
-        a = node.left
-        b = node.right
-        if b.value == "+" and b.left and b.right:
-            left = Node("*", clone(a), clone(b.left))
-            right = Node("*", clone(a), clone(b.right))
-            res.append(Node("+", left, right))
-        if a.value == "+" and a.left and a.right:
-            left = Node("*", clone(a.left), clone(b))
-            right = Node("*", clone(a.right), clone(b))
-            res.append(Node("+", left, right))
-    if node.value == "+":
-        x = node.left
-        y = node.right
-        if x and y and x.value == "*" and y.value == "*" and x.left and x.right and y.left and y.right:
-            if to_infix(x.left) == to_infix(y.left):
-                res.append(Node("*", clone(x.left), Node("+", clone(x.right), clone(y.right))))
-            if to_infix(x.right) == to_infix(y.right):
-                res.append(Node("*", Node("+", clone(x.left), clone(y.left)), clone(x.right)))
-    return res
+    return list(islice(iter_assoc_trees(op, operands), limit))
 
 
-def neighbors_once(root: Node, assoc_limit: int, dist_limit: int) -> List[Node]:
-    out: List[Node] = []
+def neighbor_rewrites(root: Node, assoc_limit: int, dist_limit: int) -> List[Tuple[Node, Node]]:
+    """The rewrites behind neighbors_once, as (target, replacement) pairs."""
+    out: List[Tuple[Node, Node]] = []
     for node in iter_nodes(root):
         if node.value in {"+", "*"}:
             ops = collect_chain_assoc(node, node.value)
             if len(ops) >= 3:
                 variants = all_assoc_trees(node.value, ops, assoc_limit + 1)
                 for v in variants:
-                    expr = to_infix(v)
-                    if expr != to_infix(node):
-                        out.append(replace_subtree(root, node, v))
+                    if structural_key(v) != structural_key(node):
+                        out.append((node, v))
                         if len(out) >= assoc_limit:
                             break
         if len(out) >= assoc_limit:
@@ -125,30 +109,49 @@ def neighbors_once(root: Node, assoc_limit: int, dist_limit: int) -> List[Node]:
     if dist_limit > 0:
         for node in iter_nodes(root):
             for repl in dist_rewrites_at_node(node):
-                out.append(replace_subtree(root, node, repl))
+                out.append((node, repl))
                 if len(out) >= assoc_limit + dist_limit:
                     return out
     return out
 
 
-def generate_forms_for_lab6(
+def neighbors_once(root: Node, assoc_limit: int, dist_limit: int) -> List[Node]:
+    return [replace_subtree(root, t, r) for t, r in neighbor_rewrites(root, assoc_limit, dist_limit)]
+
+
+def iter_forms_for_lab6(
     base_pf: Node,
     lr3_max: int,
     lr4_max: int,
     lr4_steps: int,
-) -> List[Node]:
-    s: Dict[str, Node] = {}
-
-    base_key = to_infix(base_pf)
-    s[base_key] = base_pf
-
-    for n in assoc_generate(base_pf, max_results=lr3_max):
-        s.setdefault(to_infix(n), n)
+    time_budget: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Node]:
+    """generate_forms_for_lab6 as a stream, each form as soon as it is found.
+
+    time_budget bounds the time spent inside each generator, deadline (a
+    time.monotonic() value) the whole stream.
+    """
+    seen: Set[int] = set()
+    forms = chain(
+        (base_pf,),
+        iter_assoc_forms(base_pf, max_results=lr3_max, time_budget=time_budget, deadline=deadline),
+        iter_dist_forms(base_pf, max_steps=lr4_steps, max_results=lr4_max, time_budget=time_budget, deadline=deadline),
+    )
+    for n in forms:
+        k = structural_key(n)
+        if k not in seen:
+            seen.add(k)
+            yield n
 
-    for n in dist_generate(base_pf, max_results=lr4_max, max_steps=lr4_steps):
-        s.setdefault(to_infix(n), n)
 
-    return list(s.values())
+def generate_forms_for_lab6(
+    base_pf: Node,
+    lr3_max: int,
+    lr4_max: int,
+    lr4_steps: int,
+) -> List[Node]:
+    return list(iter_forms_for_lab6(base_pf, lr3_max, lr4_max, lr4_steps))
 
 
 def eval_form(
@@ -157,15 +160,190 @@ def eval_form(
     memory_banks: int,
     mem_cost: int,
     op_cost: Dict[str, int],
+    cache: Optional[EvalCache] = None,
+    cse: bool = False,
 ) -> Tuple[int, int, float, float, int]:
-    tasks, _ = build_tasks(pf, op_cost)
+    if cache is not None:
+        config = config_key(p, memory_banks, mem_cost, op_cost, cse)
+        hit = cache.get(pf, config)
+        if hit is not None:
+            return hit
+    tasks = build_task_graph(pf, op_cost, cse=cse)
     t1 = sequential_time(tasks)
     tp, _runs = schedule_dataflow(tasks, processors=p, memory_banks=memory_banks, mem_cost=mem_cost)
     s = (t1 / tp) if tp > 0 else 0.0
     e = (s / p) if p > 0 else 0.0
+    if cache is not None:
+        cache.put(pf, config, (tp, t1, s, e, len(tasks)))
     return tp, t1, s, e, len(tasks)
 
 
+def _eval_packed(
+    packed: bytes,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    cse: bool = False,
+) -> List[Tuple[int, int, float, float, int]]:
+    return [eval_form(f, p, memory_banks, mem_cost, op_cost, cse=cse) for f in unpack_forms(packed)]
+
+
+def _chunk_size(count: int, workers: int, per_worker: int) -> int:
+    # Items per chunk for about per_worker chunks on each of `workers`.
+    return max(1, -(-count // (per_worker * workers)))
+
+
+def evaluate_forms(
+    forms: Iterable[Node],
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    min_parallel: int = 256,
+    cache: Optional[EvalCache] = None,
+    cse: bool = False,
+    chunksize: Optional[int] = None,
+) -> List[Tuple[int, int, float, float, int]]:
+    """eval_form over a batch, results in input order.
+
+    Batches of at least min_parallel forms are fanned out over `executor`, or
+    over a temporary process pool with `workers` processes. Each chunk of
+    forms is sent as one core.serialize.pack_forms blob rather than as
+    pickled Node graphs. By default there are four chunks per worker:
+    workers (default os.cpu_count()) is taken as the size of the pool that
+    runs them, so with an executor pass its size as well, or a chunksize.
+    With a cache, only the misses are evaluated. With cse, repeated
+    subexpressions are computed once (see build_task_graph).
+    """
+    forms = list(forms)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results: List[Optional[Tuple[int, int, float, float, int]]] = [None] * len(forms)
+    todo = list(range(len(forms)))
+    if cache is not None:
+        config = config_key(p, memory_banks, mem_cost, op_cost, cse)
+        todo = []
+        for i, f in enumerate(forms):
+            results[i] = cache.get(f, config)
+            if results[i] is None:
+                todo.append(i)
+
+    if len(todo) < min_parallel or (executor is None and workers <= 1):
+        fresh = [eval_form(forms[i], p, memory_banks, mem_cost, op_cost, cse=cse) for i in todo]
+    else:
+        job = partial(_eval_packed, p=p, memory_banks=memory_banks, mem_cost=mem_cost, op_cost=op_cost, cse=cse)
+        if chunksize is None:
+            chunksize = _chunk_size(len(todo), workers, 4)
+        packed = [pack_forms(forms[i] for i in todo[k:k + chunksize]) for k in range(0, len(todo), chunksize)]
+        if executor is not None:
+            fresh = [r for rows in executor.map(job, packed) for r in rows]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                fresh = [r for rows in pool.map(job, packed) for r in rows]
+
+    for i, r in zip(todo, fresh):
+        results[i] = r
+        if cache is not None:
+            cache.put(forms[i], config, r)
+    return results  # type: ignore[return-value]
+
+
+def bound_form(
+    pf: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    cse: bool = False,
+) -> int:
+    return makespan_lower_bound(build_task_graph(pf, op_cost, cse=cse), p, memory_banks, mem_cost)
+
+
+def evaluate_pruned(
+    forms: List[Node],
+    keep: int,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    stats: Optional[PruneStats] = None,
+    chunk: int = 8,
+    cse: bool = False,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    min_parallel: int = 256,
+    **eval_kw: object,
+) -> List[Optional[Tuple[int, int, float, float, int]]]:
+    """Evaluate only the forms that can still reach the `keep` best Tp values.
+
+    Forms are simulated in increasing lower-bound order; once a bound
+    exceeds the keep-th best Tp seen so far, the remaining forms are skipped
+    and their result is None. While at least min_parallel forms are left
+    and evaluate_forms would use a pool, batches hold min_parallel forms so
+    that they are fanned out, and without an executor one pool is kept for
+    the whole call; smaller remainders go in batches of max(chunk, keep).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    parallel = executor is not None or workers > 1
+    bounds = [bound_form(f, p, memory_banks, mem_cost, op_cost, cse) for f in forms]
+    order = sorted(range(len(forms)), key=lambda i: bounds[i])
+    results: List[Optional[Tuple[int, int, float, float, int]]] = [None] * len(forms)
+    worst_kept: List[int] = []
+    pos = 0
+    own_pool = executor is None and parallel and len(forms) >= min_parallel
+    with ProcessPoolExecutor(max_workers=workers) if own_pool else nullcontext(executor) as pool:
+        while pos < len(order):
+            threshold = -worst_kept[0] if len(worst_kept) >= keep else None
+            step = max(chunk, keep)
+            if parallel and len(order) - pos >= min_parallel:
+                step = max(step, min_parallel)
+            batch: List[int] = []
+            while pos < len(order) and len(batch) < step:
+                if threshold is not None and bounds[order[pos]] > threshold:
+                    break
+                batch.append(order[pos])
+                pos += 1
+            if not batch:
+                break
+            rows = evaluate_forms(
+                [forms[i] for i in batch], p, memory_banks, mem_cost, op_cost,
+                workers=workers, executor=pool, min_parallel=min_parallel, cse=cse, **eval_kw,
+            )
+            for i, r in zip(batch, rows):
+                results[i] = r
+                heapq.heappush(worst_kept, -r[0])
+                if len(worst_kept) > keep:
+                    heapq.heappop(worst_kept)
+            if stats is not None:
+                stats.evaluated += len(batch)
+    if stats is not None:
+        stats.pruned += len(order) - pos
+    return results
+
+
+def find_optimal(
+    forms: List[Node],
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    stats: Optional[PruneStats] = None,
+    **eval_kw: object,
+) -> EvalRow:
+    """pick_optimal over forms, skipping simulations that cannot win."""
+    results = evaluate_pruned(forms, 1, p, memory_banks, mem_cost, op_cost, stats, **eval_kw)
+    rows = [
+        EvalRow(i, to_infix(pf), *r)
+        for i, (pf, r) in enumerate(zip(forms, results), start=1)
+        if r is not None
+    ]
+    return pick_optimal(rows)
+
+
 def print_results(rows: List[EvalRow], title: str) -> None:
     print(title)
     print("idx | Tp | T1 | S | E | ops | form")
@@ -187,6 +365,35 @@ def pick_optimal(rows: List[EvalRow]) -> EvalRow:
     return best
 
 
+def _expand_incremental(
+    parents: List[Node],
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    neighbors_assoc: int,
+    neighbors_dist: int,
+    cache: Optional[EvalCache] = None,
+) -> Tuple[List[Node], List[Tuple[int, int, float, float, int]]]:
+    # Parents are evaluated in full (their logs seed the neighbours), so the
+    # cache is only filled here, not consulted.
+    config = config_key(p, memory_banks, mem_cost, op_cost) if cache is not None else None
+    flat: List[Node] = []
+    results = []
+    rest = []
+    for node in parents:
+        pe = evaluate(node, p, memory_banks, mem_cost, op_cost)
+        results.append(pe.result())
+        for target, repl in neighbor_rewrites(node, neighbors_assoc, neighbors_dist):
+            ce = evaluate_rewrite(pe, target, repl)
+            flat.append(ce.form)
+            rest.append(ce.result())
+    if cache is not None:
+        for f, r in zip(parents + flat, results + rest):
+            cache.put(f, config, r)
+    return flat, results + rest
+
+
 def directed_search(
     start: Node,
     p: int,
@@ -197,8 +404,24 @@ def directed_search(
     depth: int,
     neighbors_assoc: int,
     neighbors_dist: int,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[EvalCache] = None,
+    prune: bool = False,
+    stats: Optional[PruneStats] = None,
+    cse: bool = False,
+    incremental: bool = False,
 ) -> List[EvalRow]:
-    seen: Set[str] = set()
+    """Beam search over neighbors_once, from start.
+
+    With incremental, every neighbour is evaluated from its parent's
+    schedule with core.incremental.evaluate_rewrite instead of from
+    scratch; the results are the same. It needs cse off, and the neighbours
+    are then evaluated in this process without bound pruning.
+    """
+    if incremental and cse:
+        raise ValueError("incremental evaluation needs cse=False")
+    seen: Set[int] = set()
     frontier: List[Tuple[Node, int]] = [(start, 0)]
     best_rows: List[EvalRow] = []
     idx = 0
@@ -207,19 +430,34 @@ def directed_search(
         return (tp, -e, ops)
 
     for _ in range(depth):
-        candidates: List[Tuple[Tuple[int, float, int], Node]] = []
+        parents: List[Node] = []
         for node, _d in frontier:
-            k = to_infix(node)
+            k = structural_key(node)
             if k in seen:
                 continue
             seen.add(k)
+            parents.append(node)
 
-            tp, t1, s, e, ops = eval_form(node, p, memory_banks, mem_cost, op_cost)
-            idx += 1
-            best_rows.append(EvalRow(idx, k, tp, t1, s, e, ops))
+        if incremental:
+            flat, results = _expand_incremental(
+                parents, p, memory_banks, mem_cost, op_cost, neighbors_assoc, neighbors_dist, cache
+            )
+        else:
+            flat = [nb for node in parents for nb in neighbors_once(node, neighbors_assoc, neighbors_dist)]
+            eval_kw = dict(workers=workers, executor=executor, cache=cache, cse=cse)
+            if prune:
+                results = evaluate_forms(parents, p, memory_banks, mem_cost, op_cost, **eval_kw)
+                results += evaluate_pruned(flat, beam_width, p, memory_banks, mem_cost, op_cost, stats, **eval_kw)
+            else:
+                results = evaluate_forms(parents + flat, p, memory_banks, mem_cost, op_cost, **eval_kw)
 
-            for nb in neighbors_once(node, assoc_limit=neighbors_assoc, dist_limit=neighbors_dist):
-                tp2, t12, s2, e2, ops2 = eval_form(nb, p, memory_banks, mem_cost, op_cost)
+        candidates: List[Tuple[Tuple[int, float, int], Node]] = []
+        for node, (tp, t1, s, e, ops) in zip(parents, results):
+            idx += 1
+            best_rows.append(EvalRow(idx, to_infix(node), tp, t1, s, e, ops))
+        for nb, r in zip(flat, results[len(parents):]):
+            if r is not None:
+                tp2, t12, s2, e2, ops2 = r
                 candidates.append((score(tp2, e2, ops2), nb))
 
         candidates.sort(key=lambda x: x[0])
@@ -234,6 +472,347 @@ def directed_search(
     return best_rows
 
 
+def _expand(
+    parents: List[Node],
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    neighbors_assoc: int,
+    neighbors_dist: int,
+    cse: bool = False,
+) -> Tuple[List[Node], List[Tuple[int, int, float, float, int]]]:
+    # Distinct neighbours of parents (in neighbor_rewrites order) with their
+    # eval_form results. Without cse they are evaluated incrementally, and a
+    # duplicate is dropped before it is scheduled.
+    seen = {structural_key(node) for node in parents}
+    forms: List[Node] = []
+    results = []
+    for node in parents:
+        pe = None if cse else evaluate(node, p, memory_banks, mem_cost, op_cost)
+        for target, repl in neighbor_rewrites(node, neighbors_assoc, neighbors_dist):
+            nb = rewrite_form(pe, target, repl) if pe is not None else replace_subtree(node, target, repl)
+            k = structural_key(nb)
+            if k in seen:
+                continue
+            seen.add(k)
+            forms.append(nb)
+            if pe is not None:
+                results.append(evaluate_rewrite(pe, target, repl, nb).result())
+            else:
+                results.append(eval_form(nb, p, memory_banks, mem_cost, op_cost, cse=cse))
+    return forms, results
+
+
+def _expand_packed(packed: bytes, **kw: object) -> Tuple[bytes, List[Tuple[int, int, float, float, int]]]:
+    forms, results = _expand(list(unpack_forms(packed)), **kw)  # type: ignore[arg-type]
+    return pack_forms(forms), results
+
+
+@key_scope()
+def beam_search(
+    start: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    beam_width: int,
+    depth: int,
+    neighbors_assoc: int,
+    neighbors_dist: int,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    seed: Optional[int] = None,
+    cse: bool = False,
+    stats: Optional[BeamStats] = None,
+) -> List[EvalRow]:
+    """directed_search built for deep and wide beams.
+
+    Each level the frontier is split into two chunks per worker that are
+    expanded and scored on `executor` (or a pool of `workers` processes,
+    kept for the whole search), shipped as pack_forms blobs. As in
+    evaluate_forms, workers is the size of the pool in use, so pass it
+    along with an executor. Forms already expanded or
+    already produced in this level are dropped by structural key, and the
+    beam_width best candidates by (Tp, -E, ops) are taken with a bounded
+    heap. Ties go to the earlier candidate, or, with a seed, in an order
+    drawn from random.Random(seed). Chunks are merged in frontier order, so
+    the result only depends on the seed, not on the number of workers.
+
+    Returns a row for every form of levels 0 (start) to depth - 1, best
+    first: the forms directed_search expands with the same depth. The last
+    level is scored but not expanded, as its neighbours would not be
+    returned. Structural keys are taken in a key_scope of the call, so the
+    forms seen do not stay in the key table.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    job = dict(
+        p=p,
+        memory_banks=memory_banks,
+        mem_cost=mem_cost,
+        op_cost=op_cost,
+        neighbors_assoc=neighbors_assoc,
+        neighbors_dist=neighbors_dist,
+        cse=cse,
+    )
+    rng = random.Random(seed) if seed is not None else None
+    seen: Set[int] = {structural_key(start)}
+    frontier = [(start, eval_form(start, p, memory_banks, mem_cost, op_cost, cse=cse))]
+    rows: List[EvalRow] = []
+    pool: Optional[Executor] = None
+    if executor is None and workers > 1:
+        pool = executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for level in range(depth):
+            for node, r in frontier:
+                rows.append(EvalRow(len(rows) + 1, to_infix(node), *r))
+            if level == depth - 1:
+                break
+            parents = [node for node, _r in frontier]
+            if executor is None or len(parents) < 2:
+                chunks = [_expand(parents, **job)]  # type: ignore[arg-type]
+            else:
+                size = _chunk_size(len(parents), workers, 2)
+                packed = [pack_forms(parents[k:k + size]) for k in range(0, len(parents), size)]
+                chunks = [
+                    (list(unpack_forms(blob)), res)
+                    for blob, res in executor.map(partial(_expand_packed, **job), packed)
+                ]
+
+            level_keys: Set[int] = set()
+            candidates = []
+            for forms, results in chunks:
+                for nb, r in zip(forms, results):
+                    k = structural_key(nb)
+                    if k in seen or k in level_keys:
+                        if stats is not None:
+                            stats.duplicates += 1
+                        continue
+                    level_keys.add(k)
+                    tie = rng.random() if rng is not None else 0.0
+                    candidates.append(((r[0], -r[3], r[4], tie), len(candidates), nb, r))
+                if stats is not None:
+                    stats.evaluated += len(forms)
+            if stats is not None:
+                stats.expanded += len(parents)
+
+            frontier = [(nb, r) for _score, _i, nb, r in heapq.nsmallest(beam_width, candidates)]
+            seen.update(structural_key(nb) for nb, _r in frontier)
+            if not frontier:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    rows.sort(key=lambda r: (r.tp, -r.e, r.ops))
+    return rows
+
+
+def _restart(packed: bytes, method: str, seed: int, **kw: object) -> Tuple[bytes, List[Tuple[int, int, float, float, int]]]:
+    trace: SearchTrace = METHODS[method](unpack_node(packed), seed=seed, **kw)
+    return pack_forms(f for f, _r in trace.improvements), [r for _f, r in trace.improvements]
+
+
+def metaheuristic_search(
+    start: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    method: str = "anneal",
+    restarts: int = 4,
+    max_evals: int = 1000,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    **options: object,
+) -> List[EvalRow]:
+    """Independent restarts of core.metaheuristic `method` ("anneal" or
+    "tabu") from start, each with max_evals evaluations.
+
+    Restarts run on `executor`, or on a pool of `workers` processes, and
+    their seeds are drawn from random.Random(seed), so a fixed seed gives
+    the same rows for any number of workers. options go to the method
+    (t_start, t_end; tenure, sample_size, max_stalls).
+
+    Returns, like directed_search, one row per distinct form that was a
+    best-so-far in some restart, best first.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {sorted(METHODS)}")
+    if restarts <= 0:
+        raise ValueError("restarts must be > 0")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(restarts)]
+    job = partial(
+        _restart,
+        pack_node(start),
+        method,
+        p=p,
+        memory_banks=memory_banks,
+        mem_cost=mem_cost,
+        op_cost=op_cost,
+        max_evals=max_evals,
+        **options,
+    )
+    if executor is not None and restarts > 1:
+        runs = list(executor.map(job, seeds))
+    elif workers > 1 and restarts > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, restarts)) as pool:
+            runs = list(pool.map(job, seeds))
+    else:
+        runs = [job(s) for s in seeds]
+
+    seen: Set[int] = set()
+    rows: List[EvalRow] = []
+    for blob, results in runs:
+        for form, r in zip(unpack_forms(blob), results):
+            k = structural_key(form)
+            if k not in seen:
+                seen.add(k)
+                rows.append(EvalRow(len(rows) + 1, to_infix(form), *r))
+    rows.sort(key=lambda r: (r.tp, -r.e, r.ops))
+    return rows
+
+
+class _Anytime:
+    """Budget, cancellation, best-so-far and progress of one anytime_search."""
+
+    def __init__(
+        self,
+        time_budget: Optional[float],
+        max_evals: Optional[int],
+        cancel: Optional[Event],
+        progress: Optional[Callable[[Progress], None]],
+        interval: float,
+    ) -> None:
+        self.started = monotonic()
+        self.deadline = self.started + time_budget if time_budget is not None else None
+        self.max_evals = max_evals
+        self.cancel = cancel
+        self.progress = progress
+        self.interval = interval
+        self.next_report = self.started + interval
+        self.evaluations = 0
+        self.best: Optional[EvalRow] = None
+        self.stopped: Optional[str] = None
+        self.phase = "generate"
+        self.frontier = 0
+
+    def should_stop(self) -> bool:
+        if self.stopped is None:
+            if self.cancel is not None and self.cancel.is_set():
+                self.stopped = "cancelled"
+            elif self.max_evals is not None and self.evaluations >= self.max_evals:
+                self.stopped = "evals"
+            elif self.deadline is not None and monotonic() >= self.deadline:
+                self.stopped = "time"
+        return self.stopped is not None
+
+    def record(self, node: Node, r: Tuple[int, int, float, float, int]) -> None:
+        self.evaluations += 1
+        best = self.best
+        if best is None or (r[0], -r[3], r[4]) < (best.tp, -best.e, best.ops):
+            self.best = EvalRow(self.evaluations, to_infix(node), *r)
+        if self.progress is not None and monotonic() >= self.next_report:
+            self.report()
+
+    def report(self) -> None:
+        now = monotonic()
+        elapsed = now - self.started
+        rate = (self.evaluations / elapsed) if elapsed > 0 else 0.0
+        self.progress(Progress(self.phase, self.evaluations, elapsed, rate, self.best, self.frontier))  # type: ignore[misc, arg-type]
+        self.next_report = now + self.interval
+
+
+@key_scope()
+def anytime_search(
+    start: Node,
+    p: int,
+    memory_banks: int,
+    mem_cost: int,
+    op_cost: Dict[str, int],
+    time_budget: Optional[float] = None,
+    max_evals: Optional[int] = None,
+    cancel: Optional[Event] = None,
+    progress: Optional[Callable[[Progress], None]] = None,
+    progress_interval: float = 1.0,
+    lr3_max: int = 60,
+    lr4_max: int = 60,
+    lr4_steps: int = 4,
+    beam_width: int = 8,
+    neighbors_assoc: int = 6,
+    neighbors_dist: int = 6,
+    cse: bool = False,
+) -> AnytimeResult:
+    """Best form found within a budget of time_budget seconds and/or
+    max_evals evaluations, or until cancel is set from another thread.
+
+    First the forms of generate_forms_for_lab6 are evaluated as they are
+    generated. Then a beam search (as in directed_search, without a depth
+    limit) continues from the beam_width best, never evaluating a form
+    twice, until the budget runs out or no new forms are left. The budget
+    is checked before every evaluation. start is always evaluated, so there
+    is always a best row; its idx is the evaluation that found it.
+
+    progress, if given, is called at most every progress_interval seconds
+    and once at the end. As in beam_search, structural keys are taken in a
+    key_scope of the call.
+    """
+    if time_budget is None and max_evals is None and cancel is None:
+        raise ValueError("anytime_search needs time_budget, max_evals or cancel")
+    if max_evals is not None and max_evals <= 0:
+        raise ValueError("max_evals must be > 0")
+    run = _Anytime(time_budget, max_evals, cancel, progress, progress_interval)
+    seen: Set[int] = set()
+
+    scored: List[Tuple[Tuple[int, float, int], int, Node, Optional[FormEval]]] = []
+    for node in iter_forms_for_lab6(start, lr3_max, lr4_max, lr4_steps, deadline=run.deadline):
+        if run.evaluations and run.should_stop():
+            break
+        seen.add(structural_key(node))
+        r = eval_form(node, p, memory_banks, mem_cost, op_cost, cse=cse)
+        run.record(node, r)
+        scored.append(((r[0], -r[3], r[4]), len(scored), node, None))
+
+    run.phase = "search"
+    frontier = heapq.nsmallest(beam_width, scored)
+    while frontier and not run.should_stop():
+        run.frontier = len(frontier)
+        candidates: List[Tuple[Tuple[int, float, int], int, Node, Optional[FormEval]]] = []
+        for _score, _i, node, pe in frontier:
+            if run.should_stop():
+                break
+            if pe is None and not cse:
+                pe = evaluate(node, p, memory_banks, mem_cost, op_cost)
+            for target, repl in neighbor_rewrites(node, neighbors_assoc, neighbors_dist):
+                if run.should_stop():
+                    break
+                nb = rewrite_form(pe, target, repl) if pe is not None else replace_subtree(node, target, repl)
+                k = structural_key(nb)
+                if k in seen:
+                    continue
+                seen.add(k)
+                if pe is not None:
+                    ce: Optional[FormEval] = evaluate_rewrite(pe, target, repl, nb)
+                    r = ce.result()  # type: ignore[union-attr]
+                else:
+                    ce = None
+                    r = eval_form(nb, p, memory_banks, mem_cost, op_cost, cse=cse)
+                run.record(nb, r)
+                candidates.append(((r[0], -r[3], r[4]), len(candidates), nb, ce))
+        frontier = heapq.nsmallest(beam_width, candidates)
+
+    if run.stopped is None:
+        run.stopped = "exhausted"
+    if progress is not None:
+        run.report()
+    return AnytimeResult(run.best, run.evaluations, monotonic() - run.started, run.stopped)  # type: ignore[arg-type]
+
+
 def main() -> None:
     expr = "(A+B)*(C+D+E)+F*(G+H)"
 
@@ -259,11 +838,12 @@ def main() -> None:
 
     forms = generate_forms_for_lab6(base_pf, lr3_max=lr3_max, lr4_max=lr4_max, lr4_steps=lr4_steps)
 
+    cache = EvalCache()
+
     rows: List[EvalRow] = []
-    for i, pf in enumerate(forms, start=1):
-        k = to_infix(pf)
-        tp, t1, s, e, ops = eval_form(pf, P, memory_banks, mem_cost, op_cost)
-        rows.append(EvalRow(i, k, tp, t1, s, e, ops))
+    results = evaluate_forms(forms, P, memory_banks, mem_cost, op_cost, cache=cache)
+    for i, (pf, (tp, t1, s, e, ops)) in enumerate(zip(forms, results), start=1):
+        rows.append(EvalRow(i, to_infix(pf), tp, t1, s, e, ops))
 
     rows.sort(key=lambda r: (r.tp, -r.e, r.ops))
 
@@ -284,6 +864,12 @@ def main() -> None:
     print("Optimal form:")
     print(f"idx={best.idx}, Tp={best.tp}, T1={best.t1}, S={best.s:.4f}, E={best.e:.4f}, ops={best.ops}")
     print(best.expr)
+    shared = build_task_graph(forms[best.idx - 1], op_cost, cse=True)
+    tp, _t1, _s, e, ops = eval_form(forms[best.idx - 1], P, memory_banks, mem_cost, op_cost, cse=True)
+    print(f"With CSE: Tp={tp}, E={e:.4f}, ops={ops} ({shared.cse_saved} shared)")
+    exact = schedule_exact(build_task_graph(forms[best.idx - 1], op_cost), P, memory_banks, mem_cost)
+    proof = "optimal" if exact.optimal else f"best found, lower bound {exact.lower_bound}"
+    print(f"Exact schedule: Tp={exact.makespan} ({proof}; greedy Tp={best.tp})")
     print()
 
     beam_width = 8
@@ -291,6 +877,7 @@ def main() -> None:
     neighbors_assoc = 6
     neighbors_dist = 6
 
+    prune_stats = PruneStats()
     ds_rows = directed_search(
         start=base_pf,
         p=P,
@@ -301,10 +888,14 @@ def main() -> None:
         depth=depth,
         neighbors_assoc=neighbors_assoc,
         neighbors_dist=neighbors_dist,
+        cache=cache,
+        prune=True,
+        stats=prune_stats,
     )
 
     top_k = 15
     print_results(ds_rows[:top_k], f"Directed search (top {top_k})")
+    print(f"Bound pruning: {prune_stats}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+from core import equivalence
+from core.ast import Node
+from core.equivalence import count_assoc_trees, iter_assoc_trees, to_infix, unrank_assoc_tree
+from core.intern import structural_key
+
+
+def _operands(n: int):
+    return [Node(f"x{i}") for i in range(n)]
+
+
+def test_unrank_matches_enumeration_order(monkeypatch):
+    for n in range(1, 8):
+        ops = _operands(n)
+        nested = [structural_key(t) for t in iter_assoc_trees("+", ops)]
+        ranked = [structural_key(unrank_assoc_tree("+", ops, k)) for k in range(count_assoc_trees(n))]
+        monkeypatch.setattr(equivalence, "_ASSOC_NESTED_MAX", 0)
+        by_rank = [structural_key(t) for t in iter_assoc_trees("+", ops)]
+        monkeypatch.undo()
+        assert nested == ranked == by_rank
+        assert len(set(nested)) == count_assoc_trees(n)
+
+
+def test_long_chains_do_not_recurse():
+    ops = _operands(1500)
+    first = next(iter_assoc_trees("*", ops))
+    assert to_infix(first).startswith("(x0*(x1*(x2*")
+    last = unrank_assoc_tree("*", ops, count_assoc_trees(1500) - 1)
+    assert to_infix(last).endswith("*x1498)*x1499)")
@@ -0,0 +1,86 @@
+import random
+from typing import List
+
+from core.exact import schedule_exact
+from core.schedule import Task
+
+
+def _brute_force(tasks: List[Task], processors: int, memory_banks: int, mem_cost: int) -> int:
+    # Smallest makespan over every assignment of integer start times, in the
+    # interval model of schedule_exact: a task holds a processor from its
+    # start a to a + mem_cost + duration and a bank from a to a + mem_cost,
+    # and starts after its operands finish.
+    order: List[Task] = []
+    while len(order) < len(tasks):
+        done = {t.id for t in order}
+        order.extend(t for t in tasks if t.id not in done and all(d in done for d in t.deps))
+    c = max(mem_cost + t.duration for t in tasks)
+    while True:
+        procs = [0] * c
+        banks = [0] * c
+        finish = {}
+
+        def place(k: int) -> bool:
+            if k == len(order):
+                return True
+            t = order[k]
+            f = mem_cost + t.duration
+            for a in range(max((finish[d] for d in t.deps), default=0), c - f + 1):
+                if any(procs[x] == processors for x in range(a, a + f)):
+                    continue
+                if any(banks[x] == memory_banks for x in range(a, a + mem_cost)):
+                    continue
+                for x in range(a, a + f):
+                    procs[x] += 1
+                for x in range(a, a + mem_cost):
+                    banks[x] += 1
+                finish[t.id] = a + f
+                if place(k + 1):
+                    return True
+                for x in range(a, a + f):
+                    procs[x] -= 1
+                for x in range(a, a + mem_cost):
+                    banks[x] -= 1
+            return False
+
+        if place(0):
+            return c
+        c += 1
+
+
+def _random_tasks(rng: random.Random, n: int) -> List[Task]:
+    # Random DAG whose ids are not in topological order.
+    order = list(range(1, n + 1))
+    rng.shuffle(order)
+    tasks = []
+    for k, i in enumerate(order):
+        deps = tuple(d for d in order[:k] if rng.random() < 0.3)
+        tasks.append(Task(i, "op", rng.randint(1, 5), deps))
+    return tasks
+
+
+def test_bank_wait_is_not_double_counted():
+    tasks = [Task(1, "op", 2, ()), Task(2, "op", 3, ()), Task(3, "op", 5, ()), Task(4, "op", 5, (1,))]
+    res = schedule_exact(tasks, 2, 1, 1)
+    assert res.optimal
+    assert res.makespan == 10 == _brute_force(tasks, 2, 1, 1)
+
+
+def test_ids_need_not_be_topological():
+    # Task 1 depends on task 3: the bound must not read its head before
+    # computing it.
+    tasks = [Task(2, "op", 3, ()), Task(3, "op", 3, ()), Task(4, "op", 2, ()), Task(5, "op", 5, (2, 4)), Task(1, "op", 3, (3,))]
+    res = schedule_exact(tasks, 2, 1, 2)
+    assert res.optimal
+    assert res.makespan == 14 == _brute_force(tasks, 2, 1, 2)
+
+
+def test_matches_brute_force_on_random_graphs():
+    rng = random.Random(7)
+    for _ in range(200):
+        tasks = _random_tasks(rng, rng.randint(1, 6))
+        p, banks, mem = rng.randint(1, 3), rng.randint(1, 2), rng.randint(0, 2)
+        res = schedule_exact(tasks, p, banks, mem)
+        assert res.optimal
+        assert res.makespan == _brute_force(tasks, p, banks, mem), (tasks, p, banks, mem)
+        assert res.lower_bound == res.makespan
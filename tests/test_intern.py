@@ -0,0 +1,43 @@
+from core import intern
+from core.ast import Node
+from core.equivalence import iter_assoc_forms
+from core.intern import NodeStore, key_scope, structural_key
+
+
+def _tree() -> Node:
+    return Node("+", Node("*", Node("a"), Node("b")), Node("+", Node("c"), Node("d")))
+
+
+def test_clear_only_empties_the_store():
+    store = NodeStore()
+    t = _tree()
+    k = structural_key(t)
+    store.intern(t)
+    store.clear()
+    assert len(store) == 0
+    assert structural_key(t) == k == structural_key(_tree())
+
+
+def test_key_scope_releases_its_table():
+    t = _tree()
+    k = structural_key(t)
+    size = len(intern._KEYS)
+    with key_scope():
+        inner = structural_key(Node("-", _tree(), Node("e")))
+        assert structural_key(t) != k
+        assert structural_key(t) == structural_key(_tree())
+        assert len(intern._KEYS) > 0
+    assert len(intern._KEYS) == size
+    assert structural_key(t) == k
+    assert structural_key(Node("-", _tree(), Node("e"))) != inner
+
+
+def test_generator_is_unaffected_by_other_stores():
+    root = Node("+", Node("+", Node("+", Node("a"), Node("b")), Node("c")), Node("d"))
+    forms = []
+    for x in iter_assoc_forms(root):
+        other = NodeStore()
+        other.intern(x)
+        other.clear()
+        forms.append(structural_key(x))
+    assert len(forms) == len(set(forms)) == 5
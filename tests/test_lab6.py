@@ -0,0 +1,18 @@
+from core.parallel_form import build_parallel_form
+from core.parse import parse_expression
+from lab6.lab6 import PruneStats, find_optimal, generate_forms_for_lab6
+
+OP_COST = {"+": 1, "-": 1, "*": 2, "/": 4}
+
+
+def test_pruning_does_not_depend_on_workers():
+    base = build_parallel_form(parse_expression("a*b+c*d+e*(f+g+h)+i*(j+k)"))
+    forms = generate_forms_for_lab6(base, 60, 60, 4)
+    assert len(forms) < 256
+    runs = []
+    for workers in (1, 4):
+        stats = PruneStats()
+        best = find_optimal(forms, 4, 2, 1, OP_COST, stats, workers=workers)
+        runs.append((best.tp, stats.evaluated, stats.pruned))
+    assert runs[0] == runs[1]
+    assert runs[0][2] > 0
@@ -0,0 +1,58 @@
+import random
+from copy import deepcopy
+
+from core.ast import Node
+from core.intern import structural_key
+from core.parallel_form import build_parallel_form, flatten_plus_mul, rewrite_div_chain, rewrite_sub_chain
+
+
+def _reference(t: Node) -> Node:
+    return flatten_plus_mul(rewrite_sub_chain(rewrite_div_chain(t)))
+
+
+def _random_tree(rng: random.Random, ops: int, ops_set: str = "+-*/", unary: float = 0.1) -> Node:
+    # Random tree with `ops` operations. A - or / node has one operand with
+    # probability `unary`; + and * always have two, as chain flattening is
+    # only defined for binary chains.
+    if ops == 0:
+        return Node(rng.choice("abcde"))
+    op = rng.choice(ops_set)
+    if op in "-/" and rng.random() < unary:
+        child = _random_tree(rng, ops - 1, ops_set, unary)
+        return Node(op, child, None) if rng.random() < 0.5 else Node(op, None, child)
+    left = rng.randint(0, ops - 1)
+    return Node(op, _random_tree(rng, left, ops_set, unary), _random_tree(rng, ops - 1 - left, ops_set, unary))
+
+
+def _chain(op: str, n: int, left_deep: bool) -> Node:
+    t = Node("x0")
+    for i in range(1, n + 1):
+        t = Node(op, t, Node(f"x{i}")) if left_deep else Node(op, Node(f"x{i}"), t)
+    return t
+
+
+def _check(t: Node) -> None:
+    before = deepcopy(t)
+    fused = build_parallel_form(t)
+    assert structural_key(fused) == structural_key(_reference(t))
+    assert t == before
+
+
+def test_matches_reference_on_random_trees():
+    rng = random.Random(14)
+    for _ in range(2000):
+        _check(_random_tree(rng, rng.randint(0, 25)))
+
+
+def test_matches_reference_on_single_operator_trees():
+    rng = random.Random(15)
+    for op in "+-*/":
+        for _ in range(200):
+            _check(_random_tree(rng, rng.randint(1, 40), op))
+
+
+def test_matches_reference_on_chains():
+    for op in "+-*/":
+        for n in (1, 2, 3, 7, 8, 9, 33):
+            _check(_chain(op, n, True))
+            _check(_chain(op, n, False))
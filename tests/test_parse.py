@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from core.equivalence import to_infix
+from core.parse import iter_parse_many, parse_many
+
+
+def test_parse_many_iterable():
+    res = parse_many(["a+b", "a+", "(c)"])
+    assert [r.ok for r in res] == [True, False, True]
+    assert to_infix(res[0].tree) == "(a+b)"
+    assert res[1].pos is not None
+
+
+def test_parse_many_path(tmp_path: Path):
+    src = tmp_path / "exprs.txt"
+    src.write_text("a+b\n\nc*d\r\n")
+    res = parse_many(src)
+    assert [(r.index, to_infix(r.tree)) for r in res] == [(0, "(a+b)"), (2, "(c*d)")]
+
+
+def test_bare_str_is_rejected():
+    with pytest.raises(TypeError):
+        parse_many("a+b")
+    with pytest.raises(TypeError):
+        next(iter_parse_many("a+b"))
@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from core.equivalence import to_infix
+from core.parse import parse_expression
+from core.tokenize import ParseError, iter_tokens, tokenize
+
+
+def test_whitespace_is_skipped():
+    assert tokenize("a\t+ b\r\n*\n3.5\n") == ["a", "+", "b", "*", "3.5"]
+    assert tokenize("ab c + 1\t2") == ["abc", "+", "12"]
+
+
+def test_file_objects_with_trailing_newline():
+    assert to_infix(parse_expression(io.StringIO("a+b\n"))) == "(a+b)"
+    assert to_infix(parse_expression(io.BytesIO(b"(a + b)\t* c\r\n"))) == "((a+b)*c)"
+
+
+def test_positions_across_chunks():
+    src = "a1 +\n\tbc*  2\n"
+    assert list(iter_tokens(io.StringIO(src), chunk_size=2)) == list(iter_tokens(src))
+
+
+def test_unexpected_char():
+    with pytest.raises(ParseError) as err:
+        tokenize("a+b;\n")
+    assert err.value.pos == 3
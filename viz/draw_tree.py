@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict, Tuple, Union
+from typing import Dict, List, Tuple, Union
 from pathlib import Path
 import matplotlib.pyplot as plt
 from core.ast import Node, is_leaf
@@ -8,35 +8,40 @@ PathLike = Union[str, Path]
 
 def compute_positions(root: Node) -> Dict[Node, Tuple[float, float]]:
     widths: Dict[Node, float] = {}
-
-    def width(n: Node) -> float:
+    stack: List[Tuple[Node, bool]] = [(root, False)]
+    while stack:
+        n, expanded = stack.pop()
         if is_leaf(n):
             widths[n] = 1.0
-            return 1.0
-        wl = width(n.left) if n.left else 0.0
-        wr = width(n.right) if n.right else 0.0
+            continue
+        if not expanded:
+            stack.append((n, True))
+            if n.right:
+                stack.append((n.right, False))
+            if n.left:
+                stack.append((n.left, False))
+            continue
+        wl = widths[n.left] if n.left else 0.0
+        wr = widths[n.right] if n.right else 0.0
         widths[n] = max(1.0, wl + wr)
-        return widths[n]
-
-    width(root)
 
     pos: Dict[Node, Tuple[float, float]] = {}
-
-    def assign(n: Node, x0: float, x1: float, y: float) -> None:
+    todo: List[Tuple[Node, float, float, float]] = [(root, 0.0, widths[root], 0.0)]
+    while todo:
+        n, x0, x1, y = todo.pop()
         pos[n] = ((x0 + x1) / 2, y)
         if n.left and n.right:
             wl = widths[n.left]
             wr = widths[n.right]
             total = wl + wr
             split = x0 + (x1 - x0) * (wl / total)
-            assign(n.left, x0, split, y - 1)
-            assign(n.right, split, x1, y - 1)
+            todo.append((n.right, split, x1, y - 1))
+            todo.append((n.left, x0, split, y - 1))
         elif n.left:
-            assign(n.left, x0, x1, y - 1)
+            todo.append((n.left, x0, x1, y - 1))
         elif n.right:
-            assign(n.right, x0, x1, y - 1)
+            todo.append((n.right, x0, x1, y - 1))
 
-    assign(root, 0.0, widths[root], 0.0)
     return pos
 
 def draw_tree(root: Node, title: str, outpath: PathLike) -> None:
@@ -47,15 +52,14 @@ def draw_tree(root: Node, title: str, outpath: PathLike) -> None:
     fig, ax = plt.subplots(figsize=(14, 8))
     ax.axis("off")
 
-    def draw_edges(n: Node) -> None:
+    # Edges in preorder, as plot calls take the next colour of the cycle.
+    edges: List[Tuple[Node, Node]] = [(root, c) for c in (root.right, root.left) if c]
+    while edges:
+        n, child = edges.pop()
         x, y = pos[n]
-        for child in (n.left, n.right):
-            if child:
-                xc, yc = pos[child]
-                ax.plot([x, xc], [y, yc], linewidth=2)
-                draw_edges(child)
-
-    draw_edges(root)
+        xc, yc = pos[child]
+        ax.plot([x, xc], [y, yc], linewidth=2)
+        edges.extend((child, c) for c in (child.right, child.left) if c)
 
     for n, (x, y) in pos.items():
         ax.scatter([x], [y], s=1600)